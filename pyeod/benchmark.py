@@ -0,0 +1,188 @@
+"""
+Benchmarks for the hot paths on generated servers, see
+``pyeod.model.instance.generate_database``. Each run is appended
+to the output file as one line of JSON so results can be compared
+between commits::
+
+    python -m pyeod.benchmark --sizes small medium --output bench.jsonl
+
+"""
+
+from pyeod import config, packer
+from pyeod.errors import GameError
+from pyeod.frontend import (
+    DiscordGameInstance,
+    ElementPaginator,
+    InstanceManager,
+    create_leaderboard,
+)
+from pyeod.frontend.client import leaderboard_rankings
+from pyeod.model.instance import generate_database
+from types import SimpleNamespace
+import os
+import sys
+import json
+import mmap
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+SIZES = {
+    "small": {"elements": 1_000, "users": 100},
+    "medium": {"elements": 10_000, "users": 1_000},
+    "large": {"elements": 50_000, "users": 5_000},
+}
+GUILD_ID = 1
+
+
+async def measure(func, repeat: int) -> dict:
+    # func is called with the run number and may be a coroutine function
+    times = []
+    for i in range(repeat):
+        tic = time.perf_counter()
+        result = func(i)
+        if asyncio.iscoroutine(result):
+            await result
+        times.append(time.perf_counter() - tic)
+    return {
+        "runs": repeat,
+        "min_ms": min(times) * 1000,
+        "mean_ms": sum(times) / repeat * 1000,
+    }
+
+
+def load_snapshot(path: str) -> None:
+    # load_instance without the journal replay
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            packer.decode_instance(data)
+
+
+async def run_size(size: dict, seed: int) -> dict:
+    results = {}
+    rng = random.Random(seed)
+
+    tic = time.perf_counter()
+    server = DiscordGameInstance(generate_database(**size, seed=seed))
+    results["generate_database"] = {"seconds": time.perf_counter() - tic}
+    InstanceManager().add_instance(GUILD_ID, server)
+    db = server.db
+    users = list(db.users.values())
+    ctx = SimpleNamespace(
+        guild=SimpleNamespace(id=GUILD_ID), channel=SimpleNamespace(id=0)
+    )
+
+    results["calculate_infos"] = await measure(lambda i: db.calculate_infos(), 3)
+
+    filename = "benchmark.eod"
+    path = os.path.join(config.package, "db", filename)
+    results["write_snapshot"] = await measure(
+        lambda i: packer.write_snapshot(server, filename), 3
+    )
+    results["save_instance"] = await measure(
+        lambda i: packer.save_instance(server, filename).result(), 3
+    )
+    results["load_snapshot"] = await measure(lambda i: load_snapshot(path), 3)
+
+    combos = []
+    for _ in range(1000):
+        user = rng.choice(users)
+        combo = tuple(db.elem_id_lookup[rng.choice(user.inv)].name for _ in "ab")
+        combos.append((user, combo))
+
+    async def combine(i):
+        user, combo = combos[i]
+        try:
+            await server.combine(user, combo)
+        except GameError:
+            pass
+
+    results["combine"] = await measure(combine, len(combos))
+
+    elem_ids = [rng.choice(list(db.elem_id_lookup)) for _ in range(100)]
+    results["get_path_ids"] = await measure(
+        lambda i: db.get_path_ids([elem_ids[i]]), len(elem_ids)
+    )
+
+    options = list(leaderboard_rankings)
+    user = SimpleNamespace(id=users[0].id)
+    results["create_leaderboard"] = await measure(
+        lambda i: create_leaderboard(options[i], ctx, user), len(options)
+    )
+
+    # Biggest inventory, like !inv on the top player
+    top = max(users, key=lambda user: len(user.inv))
+    elements = [db.elem_id_lookup[elem_id] for elem_id in top.inv]
+    options = ["Found", "Alphabetical", "ID", "Tree Size", "Difficulty", "Tier"]
+    results["generate_pages"] = await measure(
+        lambda i: ElementPaginator.generate_pages(
+            options[i], ctx, top, elements, "Inventory", True
+        ),
+        len(options),
+    )
+
+    for user in users:
+        user.achievements = []
+    results["get_achievements"] = await measure(
+        lambda i: server.get_achievements(users[i]), min(len(users), 200)
+    )
+    return results
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=config.package_location,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", nargs="+", choices=SIZES, default=["small"])
+    parser.add_argument("--seed", type=int, default=0)
+    # Pareto alpha and scale of how far generated users get
+    parser.add_argument("--inventory-shape", type=float, default=1.2)
+    parser.add_argument("--inventory-scale", type=float, default=20)
+    parser.add_argument("--output", default="benchmark.jsonl")
+    args = parser.parse_args()
+
+    run = {
+        "commit": get_commit(),
+        "time": round(time.time()),
+        "python": sys.version.split()[0],
+        "seed": args.seed,
+        "inventory_shape": args.inventory_shape,
+        "inventory_scale": args.inventory_scale,
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        # Keep snapshots away from the real ones
+        config.package = tmp
+        for name in args.sizes:
+            print("Running", name)
+            size = dict(
+                SIZES[name],
+                inventory_shape=args.inventory_shape,
+                inventory_scale=args.inventory_scale,
+            )
+            run["results"][name] = await run_size(size, args.seed)
+
+    with open(args.output, "a") as f:
+        f.write(json.dumps(run) + "\n")
+    for name, results in run["results"].items():
+        for bench, result in results.items():
+            if "mean_ms" in result:
+                print(f"{name:>8} {bench:<20} {result['mean_ms']:10.3f}ms")
+    print("Results appended to", args.output)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -8,7 +8,7 @@ if sys.platform.startswith("win"):
 
 from pyeod import config
 from pyeod.frontend import ElementalBot, InstanceManager
-from pyeod.packer import save_instance
+from pyeod.packer import compact_instance
 from discord import Intents
 from discord.client import _cleanup_loop as cleanup_loop
 from discord.ext.commands import when_mentioned_or
@@ -65,12 +65,14 @@ def run():
     finally:
         print("Stopped")
         # Make sure final save
-        processes = []
+        futures = []
         for id, instance in InstanceManager.current.instances.items():
-            process = save_instance(instance, str(id) + ".eod")
-            processes.append(process)
-        for process in processes:
-            process.join()
+            future = compact_instance(instance, str(id) + ".eod")
+            # Unchanged instances are skipped
+            if future is not None:
+                futures.append(future)
+        for future in futures:
+            future.result()
         print("Successfully saved all instances")
     if os.path.isfile(config.stopfile):
         os.remove(config.stopfile)
@@ -8,7 +8,18 @@ from pyeod.frontend import (
     generate_embed_list,
     prepare_file,
 )
-from pyeod.packer import load_instance, save_instance
+from pyeod.packer import (
+    compact_instance,
+    delete_journal,
+    flush_writes,
+    get_last_modified,
+    load_instance,
+    prepare_instance,
+    save_journal,
+    save_stats,
+    snapshot_is_current,
+    write_current_snapshot,
+)
 from pyeod.utils import format_list
 from discord import (
     Attachment,
@@ -49,15 +60,29 @@ class Config(commands.Cog):
 
     async def load_all_instances(self):
         tic = time.perf_counter()
-        with InstanceManager.current.prevent_creation():
-            for file in glob.glob(os.path.join(config.package, "db", "*.eod")):
-                print(os.path.basename(file))
-                instance = load_instance(file)
-                guild_id = int(os.path.basename(file)[:-4])
-                InstanceManager.current.add_instance(guild_id, instance)
-        print(f"Loaded instance databases in {time.perf_counter() - tic} seconds")
+        manager = InstanceManager.current
+        files = glob.glob(os.path.join(config.package, "db", "*.eod"))
+        # Recently changed servers are the busiest, get them ready first
+        files.sort(key=get_last_modified, reverse=True)
+        # Servers not loaded yet are loaded on demand by commands
+        for file in files:
+            manager.unloaded[int(os.path.basename(file)[:-4])] = file
         self.load_event.set()
 
+        # Decoding happens in a thread so commands keep being handled
+        for file in files:
+            guild_id = int(os.path.basename(file)[:-4])
+            if manager.unloaded.get(guild_id) != file:
+                continue  # Already loaded by a command
+            # Shared with a load a command already started, failures are
+            # logged and recorded by the manager so the rest still load
+            await manager.start_loading(guild_id)
+            if guild_id in manager.failed:
+                continue
+            load_time = save_stats[os.path.basename(file)]["load_seconds"]
+            print(f"Loaded {os.path.basename(file)} in {load_time:.3f} seconds")
+        print(f"Loaded instance databases in {time.perf_counter() - tic} seconds")
+
     @commands.Cog.listener()
     async def on_ready(self):
         if self.load_event.is_set():
@@ -69,10 +94,30 @@ class Config(commands.Cog):
 
     @tasks.loop(seconds=30, reconnect=True)
     async def save(self):
-        for id, instance in InstanceManager.current.instances.items():
+        compact = self.save.current_loop % config.JOURNAL_COMPACT_SAVES == 0
+        manager = InstanceManager.current
+        for id, instance in list(manager.instances.items()):
+            filename = str(id) + ".eod"
+            path = os.path.join(config.package, "db", filename)
             await instance.db.acquire_all_locks()
             try:
-                save_instance(instance, str(id) + ".eod")
+                if manager.instances.get(id) is not instance:
+                    continue  # Replaced or removed while waiting for the locks
+                idle = manager.is_idle(id, config.INSTANCE_UNLOAD_SECONDS)
+                # Startup only loads snapshots, a journal alone is never found
+                if compact or idle or not os.path.isfile(path):
+                    compact_instance(instance, filename)
+                else:
+                    save_journal(instance, filename)
+                # Unloaded once a later loop sees the snapshot written,
+                # vote and achievement state is only kept in memory
+                if (
+                    idle
+                    and not instance.db.polls
+                    and not instance.db.achievement_events
+                    and snapshot_is_current(instance, filename)
+                ):
+                    manager.unload_instance(id, path)
             finally:
                 instance.db.release_all_locks()
 
@@ -91,32 +136,38 @@ class Config(commands.Cog):
         if ctx.author.id not in config.SERVER_CONTROL_USERS:
             raise GameError("No permission", "You don't have permission to do that!")
 
-        path = os.path.join(config.package, "db", str(guild_id) + ".eod")
-        if guild_id not in InstanceManager.current.instances:
-            msg = await ctx.respond("🤖 Server not found, uploading fresh database")
-            old_data = None
-            with open(path, "wb+") as f:
-                f.write(await file.read())
-        else:
-            msg = await ctx.respond("🤖 Server found, backing up original database")
-            with open(path, "rb") as f:
-                old_data = f.read()
+        manager = InstanceManager.current
+        filename = str(guild_id) + ".eod"
+        path = os.path.join(config.package, "db", filename)
+        data = await file.read()
+        with manager.prevent_creation():
+            if guild_id not in manager:
+                await ctx.respond("🤖 Server not found, uploading fresh database")
+            else:
+                await ctx.respond("🤖 Server found, backing up original database")
+                if guild_id in manager.instances:
+                    # Make sure the backup includes the journal
+                    await write_current_snapshot(manager.instances[guild_id], filename)
+                # Removed first so the save loop can't write it out again
+                manager.remove_instance(guild_id)
+                if os.path.isfile(path):  # Not written if it never changed
+                    with open(path, "rb") as f:
+                        old_data = f.read()
+                    stream = io.BytesIO(old_data)
+                    backup = File(stream, filename=filename)
+                    await ctx.respond("🤖 Old instance backup:", file=backup)
+
+            # Queued snapshots and journal writes of the old database
+            await asyncio.wrap_future(flush_writes())
             with open(path, "wb") as f:
-                f.write(await file.read())
-
-        with InstanceManager.current.prevent_creation():
+                f.write(data)
+            delete_journal(path)
             instance = load_instance(path)
-            if guild_id in InstanceManager.current.instances:
-                InstanceManager.current.remove_instance(guild_id)
-            InstanceManager.current.add_instance(guild_id, instance)
+            await prepare_instance(instance, path)
+            manager.add_instance(guild_id, instance)
 
         await ctx.respond("🤖 Loaded new instance")
 
-        if old_data is not None:
-            stream = io.BytesIO(old_data)
-            file = File(stream, filename=str(guild_id) + ".eod")
-            await ctx.respond("🤖 Old instance backup:", file=file)
-
     @bridge.bridge_command()
     @bridge.guild_only()
     @bridge.has_permissions(manage_channels=True)
@@ -201,7 +252,115 @@ class Config(commands.Cog):
                 )
             )
 
-        embeds = generate_embed_list(lines, f"Connected servers ({len(servers)})", 10)
+        for guild_id in InstanceManager.current.unloaded:
+            lines.append(f"(*{guild_id}*) not loaded")
+
+        count = len(servers) + len(InstanceManager.current.unloaded)
+        embeds = generate_embed_list(lines, f"Connected servers ({count})", 10)
+        paginator = FooterPaginator(embeds, loop=False)
+        await paginator.respond(ctx)
+
+    @bridge.bridge_command(guild_ids=[config.MAIN_SERVER])
+    async def save_times(self, ctx: bridge.BridgeContext):
+        """Shows how long the last load and save of each server took"""
+        if ctx.author.id not in config.SERVER_CONTROL_USERS:
+            raise GameError("No permission", "You don't have permission to do that!")
+
+        lines = []
+        for filename, stats in save_stats.items():
+            parts = [f"(*{filename[:-4]}*)"]
+            for kind in ["load", "snapshot", "journal"]:
+                if kind + "_seconds" in stats:
+                    duration = stats[kind + "_seconds"] * 1000
+                    size = stats[kind + "_bytes"]
+                    parts.append(f"{kind} **{duration:,.1f}**ms __{size:,}__ bytes")
+            lines.append(" ".join(parts))
+
+        embeds = generate_embed_list(lines, f"Last saves ({len(lines)})", 10)
+        paginator = FooterPaginator(embeds, loop=False)
+        await paginator.respond(ctx)
+
+    @bridge.bridge_command(guild_ids=[config.MAIN_SERVER])
+    async def cache_stats(self, ctx: bridge.BridgeContext):
+        """Shows how well the caches of each loaded server are doing"""
+        if ctx.author.id not in config.SERVER_CONTROL_USERS:
+            raise GameError("No permission", "You don't have permission to do that!")
+
+        lines = []
+        for guild_id, instance in InstanceManager.current.instances.items():
+            cache = instance.db.element_stats_cache
+            lookups = cache.hits + cache.misses
+            hit_rate = cache.hits / lookups * 100 if lookups else 0
+            lines.append(
+                " ".join(
+                    [
+                        f"(*{guild_id}*)",
+                        f"element stats __{len(cache):,}__/{cache.maxsize:,} users,",
+                        f"**{hit_rate:.1f}**% hits,",
+                        f"__{cache.evictions:,}__ evictions",
+                    ]
+                )
+            )
+
+        embeds = generate_embed_list(lines, f"Caches ({len(lines)})", 10)
+        paginator = FooterPaginator(embeds, loop=False)
+        await paginator.respond(ctx)
+
+    @bridge.bridge_command(guild_ids=[config.MAIN_SERVER])
+    async def lock_stats(
+        self, ctx: bridge.BridgeContext, guild_id: Optional[int] = None
+    ):
+        """Shows database lock waits and holds, with slow holds for one server"""
+        if ctx.author.id not in config.SERVER_CONTROL_USERS:
+            raise GameError("No permission", "You don't have permission to do that!")
+
+        if guild_id is None:
+            instances = InstanceManager.current.instances.items()
+        elif guild_id in InstanceManager.current.instances:
+            instances = [(guild_id, InstanceManager.current.instances[guild_id])]
+        else:
+            raise GameError("Server not found", "Could not find loaded server!")
+
+        lines = []
+        for id, instance in instances:
+            for lock in instance.db.get_locks():
+                if lock.optimistic_reads:
+                    lines.append(
+                        f"(*{id}*) **{lock.name}** "
+                        f"__{lock.optimistic_reads:,}__ reads without locking"
+                    )
+                for side in [lock.reader, lock.writer]:
+                    if not side.acquisitions:
+                        continue
+                    count = side.acquisitions
+                    line = " ".join(
+                        [
+                            f"(*{id}*) **{lock.name}** {side.mode}",
+                            f"__{count:,}__ times,",
+                            f"wait {side.wait_total / count * 1000:.2f}ms",
+                            f"(max {side.wait_max * 1000:.1f}ms),",
+                            f"hold {side.hold_total / count * 1000:.2f}ms",
+                            f"(max {side.hold_max * 1000:.1f}ms)",
+                        ]
+                    )
+                    for site, held in side.get_holders():
+                        line += f"\n> Held by `{site}` for {held:.2f}s"
+                    lines.append(line)
+
+        if guild_id is not None:
+            server = InstanceManager.current.instances[guild_id]
+            slow_holds = []
+            for lock in server.db.get_locks():
+                for entry in lock.slow_log:
+                    slow_holds.append((lock.name, *entry))
+            slow_holds.sort(key=lambda entry: entry[1], reverse=True)
+            for name, timestamp, mode, site, wait, hold in slow_holds:
+                lines.append(
+                    f"<t:{int(timestamp)}:T> **{name}** {mode} held {hold:.2f}s "
+                    f"by `{site}` after waiting {wait:.2f}s"
+                )
+
+        embeds = generate_embed_list(lines, f"Locks ({len(lines)})", 10)
         paginator = FooterPaginator(embeds, loop=False)
         await paginator.respond(ctx)
 
@@ -216,10 +375,14 @@ class Config(commands.Cog):
         if guild_id is None:
             guild_id = ctx.guild.id
 
-        if guild_id not in InstanceManager.current.instances:
+        if guild_id not in InstanceManager.current:
             raise GameError("Server not found", "Could not find server!")
 
         await ctx.defer()
+        # Make sure the snapshot includes the journal
+        server = InstanceManager.current[guild_id]
+        await write_current_snapshot(server, str(guild_id) + ".eod")
+
         path = os.path.join(config.package, "db", str(guild_id) + ".eod")
         with open(path, "rb") as f:
             data = f.read()
@@ -241,6 +404,10 @@ NOTE: __YOU__ are responsible for the storage of the backup AND the backup conta
                 raise GameError("Too soon", "You can only backup once every 12 hours!")
 
         await ctx.defer()
+        # Make sure the snapshot includes the journal
+        server = InstanceManager.current.get_or_create(ctx.guild.id)
+        await write_current_snapshot(server, str(ctx.guild.id) + ".eod")
+
         path = os.path.join(config.package, "db", str(ctx.guild.id) + ".eod")
         with open(path, "rb") as f:
             data = f.read()
@@ -288,6 +455,7 @@ NOTE: __YOU__ are responsible for the storage of the backup AND the backup conta
 
         if channel.id not in server.channels.play_channels:
             server.channels.play_channels.append(channel.id)
+            server.db.mark_changed()
         await ctx.respond(f"🤖 Successfully added <#{channel.id}> as a play channel!")
 
     @bridge.bridge_command()
@@ -299,6 +467,8 @@ NOTE: __YOU__ are responsible for the storage of the backup AND the backup conta
 
         if channel.id in server.channels.play_channels:
             server.channels.play_channels.remove(channel.id)
+            server.channel_cache.clear()
+            server.db.mark_changed()
             await ctx.respond(
                 f"🤖 Successfully removed <#{channel.id}> as a play channel!"
             )
@@ -313,6 +483,8 @@ NOTE: __YOU__ are responsible for the storage of the backup AND the backup conta
         server = InstanceManager.current.get_or_create(ctx.guild.id)
 
         server.channels.news_channel = channel.id
+        server.channel_cache.clear()
+        server.db.mark_changed()
         await ctx.respond(f"🤖 Successfully set <#{channel.id}> as the news channel!")
 
     @bridge.bridge_command()
@@ -323,6 +495,8 @@ NOTE: __YOU__ are responsible for the storage of the backup AND the backup conta
         server = InstanceManager.current.get_or_create(ctx.guild.id)
 
         server.channels.voting_channel = channel.id
+        server.channel_cache.clear()
+        server.db.mark_changed()
         await ctx.respond(f"🤖 Successfully set <#{channel.id}> as the voting channel!")
 
     @bridge.bridge_command()
@@ -333,16 +507,23 @@ NOTE: __YOU__ are responsible for the storage of the backup AND the backup conta
         server = InstanceManager.current.get_or_create(ctx.guild.id)
 
         async with server.db.element_lock.writer:
-            element = await server.db.get_element_by_str("#" + str(elem_id))
+            element = server.get_element_by_str_unsafe(None, "#" + str(elem_id))
             old_name = element.name
+            server.db.preserve(element)
             element.name = name
             server.db.elements.pop(old_name.lower())
             server.db.elements[name.lower()] = element
+            server.db.element_index.remove(old_name.lower())
+            server.db.element_index.add(name.lower())
+            server.db.clear_combo_caches()
+            server.db.add_journal_entry("element", element)
         await ctx.respond(
             f"🤖 Renamed element #{elem_id} (**{old_name}**) to **{name}** successfully!"
         )
         if server.channels.news_channel is not None:
-            channel = await self.bot.fetch_channel(server.channels.news_channel)
+            channel = await self.bot.get_server_channel(
+                server, server.channels.news_channel
+            )
             await channel.send(
                 f"🤖 Renamed element #{elem_id} (**{old_name}**) to **{name}**"
             )
@@ -354,6 +535,7 @@ NOTE: __YOU__ are responsible for the storage of the backup AND the backup conta
         server = InstanceManager.current.get_or_create(ctx.guild.id)
 
         server.vote_req = vote_req
+        server.db.mark_changed()
         await ctx.respond(f"🤖 Successfully set the vote requirement to {vote_req}")
 
     @bridge.bridge_command()
@@ -363,6 +545,7 @@ NOTE: __YOU__ are responsible for the storage of the backup AND the backup conta
         server = InstanceManager.current.get_or_create(ctx.guild.id)
 
         server.poll_limit = poll_limit
+        server.db.mark_changed()
         await ctx.respond(f"🤖 Successfully set the vote requirement to {poll_limit}")
 
     @bridge.bridge_command()
@@ -372,20 +555,24 @@ NOTE: __YOU__ are responsible for the storage of the backup AND the backup conta
         server = InstanceManager.current.get_or_create(ctx.guild.id)
 
         server.combo_limit = combo_limit
+        server.db.mark_changed()
         await ctx.respond(f"🤖 Successfully set the combo limit to {combo_limit}")
 
     @bridge.bridge_command()
     @bridge.guild_only()
     @bridge.has_permissions(administrator=True)
     async def reset_server(self, ctx: bridge.BridgeContext, confirmation_code: int = 0):
-        server = InstanceManager.current.get_or_create(ctx.guild.id)
-
         if confirmation_code != hash(ctx.guild.name):
             await ctx.respond(f"Are you absolutely sure? This will __completely wipe **ALL** data__. This cannot be undone.\n To fully delete the server redo the command with this confirmation code: {hash(ctx.guild.name)}")
         #! Delete server from instance manager AND delete save file
         else:
-            InstanceManager.current.instances.pop(ctx.guild.id)
-            db_path = os.path.join(os.path.dirname(__file__), '..', 'db', f"{ctx.guild.id}.eod")
+            # Also works for servers that are unloaded or failed to load
+            if ctx.guild.id in InstanceManager.current:
+                InstanceManager.current.remove_instance(ctx.guild.id)
+            db_path = os.path.join(config.package, "db", f"{ctx.guild.id}.eod")
+            # A queued snapshot or journal write would bring the server back
+            await asyncio.wrap_future(flush_writes())
+            delete_journal(db_path)
             if os.path.exists(db_path):
                 os.remove(db_path)
                 await ctx.respond("Server has been reset\n*Sad to see you go :pensive:*")
@@ -223,21 +223,32 @@ class Base(commands.Cog):
         if msg.guild is None:
             # Message from a DM channel
             return
-        if msg.guild.id not in InstanceManager.current.instances:
-            return
-        server = InstanceManager.current.instances[msg.guild.id]
-
         if msg.author.bot:  # No bots in eod
             return
         if msg.content.startswith("!"):
             return
-
+        manager = InstanceManager.current
+        if msg.guild.id not in manager:
+            return
+        if not msg.content.startswith(("?", "=")):
+            # Chat outside the play channels never needs the server loaded,
+            # and chat in servers not loaded since startup isn't answered
+            channels = manager.get_channels(msg.guild.id)
+            if channels is None or msg.channel.id not in channels.play_channels:
+                return
+        server = manager[msg.guild.id]
+
+        metrics = self.bot.metrics
         if msg.content.startswith("?"):
-            await self.show_element_info(server, msg)
+            with metrics.measure("message_info", msg.guild.id):
+                await self.show_element_info(server, msg)
         elif msg.content.startswith("="):
-            await self.suggest_element(server, msg.content[1:], msg, True)
-        else:
-            await self.combine_elements(server, msg)
+            with metrics.measure("message_suggest", msg.guild.id):
+                await self.suggest_element(server, msg.content[1:], msg, True)
+        elif msg.channel.id in server.channels.play_channels:
+            # Other chat messages aren't combinations, so aren't timed
+            with metrics.measure("message_combine", msg.guild.id):
+                await self.combine_elements(server, msg)
 
     @bridge.bridge_command(aliases=["s"])
     @bridge.guild_only()
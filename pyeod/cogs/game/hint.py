@@ -8,10 +8,11 @@ from pyeod.frontend import (
     generate_embed_list,
     get_page_limit,
 )
+from pyeod.model import Element, User
 from pyeod.utils import obtain_emoji
 from discord.ext.bridge import bridge_option as option_decorator
 from discord.ext import bridge, commands
-from typing import Optional
+from typing import List, Optional, Tuple
 import random
 
 
@@ -27,6 +28,60 @@ class Hint(commands.Cog):
                 chars[i] = "?"
         return "".join(chars)
 
+    # Called through element_lock.read, these must not await
+    def get_hint_lines(
+        self, server: DiscordGameInstance, user: User, element: Element
+    ) -> List[str]:
+        lines = []
+        for combo in server.db.combo_lookup[element.id]:
+            tick = all(elem in user.inv for elem in combo)
+            names = [server.db.elem_id_lookup[elem].name for elem in combo]
+            names.sort()
+            names[-1] = self.obfuscate(names[-1])
+            lines.append(obtain_emoji(tick) + " " + " + ".join(names))
+        return lines
+
+    def get_next_hint(
+        self, server: DiscordGameInstance, user: User
+    ) -> Tuple[Element, List[str]]:
+        next_id = server.db.get_next_missing(user)
+        if next_id is None:
+            raise GameError("No more elements", "You have all the elements!")
+        element = server.db.elem_id_lookup[next_id]
+        return element, self.get_hint_lines(server, user, element)
+
+    def get_hint(
+        self, server: DiscordGameInstance, user: User, element: str
+    ) -> Tuple[Element, List[str]]:
+        if not element:
+            hint_choices = server.db.get_hint_choices(user)
+            # Prefer elements right after one the user has
+            choices = [i for i in hint_choices if i - 1 in user.inv]
+            if not len(choices):
+                choices = list(hint_choices)
+            if not len(choices):
+                # User has every single element
+                raise GameError("No more elements", "You have all the elements!")
+
+            elem = server.db.elem_id_lookup[random.choice(choices)]
+        else:
+            elem = server.get_element_by_str_unsafe(user, element)
+        return elem, self.get_hint_lines(server, user, elem)
+
+    def get_product_lines(
+        self, server: DiscordGameInstance, user: User, elem: Element
+    ) -> List[str]:
+        lines = []
+        sorter = lambda combo: server.db.combos[combo].id
+        for combo in sorted(server.db.used_in_lookup[elem.id], key=sorter):
+            result = server.db.combos[combo]
+            tick = result.id in user.inv
+            line = obtain_emoji(tick) + " " + result.name
+            if line not in lines:
+                # In case multiple combos use this element for the same result
+                lines.append(obtain_emoji(tick) + " " + result.name)
+        return lines
+
     @bridge.bridge_command(aliases=["n"])
     @bridge.guild_only()
     async def next(self, ctx: bridge.BridgeContext):
@@ -34,32 +89,9 @@ class Hint(commands.Cog):
         server = InstanceManager.current.get_or_create(ctx.guild.id)
         user = await server.login_user(ctx.author.id)
 
-        async with server.db.element_lock.reader:
-            sorted_inv = sorted(user.inv)
-            last_element = sorted_inv[0]
-            for i in range(1, len(sorted_inv)):
-                found = False
-                for j in range(last_element + 1, sorted_inv[i]):
-                    if j in server.db.elem_id_lookup:
-                        last_element = j - 1
-                        found = True
-                        break
-                if found:
-                    break
-                last_element = sorted_inv[i]
-            else:
-                # User has all elements
-                if last_element + 1 not in server.db.elem_id_lookup:
-                    raise GameError("No more elements", "You have all the elements!")
-            element = server.db.elem_id_lookup[last_element + 1]
-
-            lines = []
-            for combo in server.db.combo_lookup[element.id]:
-                tick = all(elem in user.inv for elem in combo)
-                names = [server.db.elem_id_lookup[elem].name for elem in combo]
-                names.sort()
-                names[-1] = self.obfuscate(names[-1])
-                lines.append(obtain_emoji(tick) + " " + " + ".join(names))
+        element, lines = await server.db.element_lock.read(
+            self.get_next_hint, server, user
+        )
 
         limit = get_page_limit(server, ctx.channel.id)
         embeds = generate_embed_list(
@@ -84,36 +116,9 @@ class Hint(commands.Cog):
         server = InstanceManager.current.get_or_create(ctx.guild.id)
         user = await server.login_user(ctx.author.id)
 
-        async with server.db.element_lock.reader:
-            if not element:
-                inv_set = set(user.inv)
-                max_id = max(inv_set)
-                choices = set()
-                for i in range(1, max_id + 1):
-                    if i not in inv_set:
-                        if i in server.db.elem_id_lookup and i - 1 in inv_set:
-                            if all(x in inv_set for x in server.db.combo_lookup[i][0]):
-                                choices.add(i)
-                if not len(choices):
-                    for i in range(max_id + 1, max_id + 21):
-                        if i in server.db.elem_id_lookup:
-                            if all(x in inv_set for x in server.db.combo_lookup[i][0]):
-                                choices.add(i)
-                if not len(choices):
-                    # User has every single element
-                    raise GameError("No more elements", "You have all the elements!")
-
-                elem = server.db.elem_id_lookup[random.choice(list(choices))]
-            else:
-                elem = await server.get_element_by_str(user, element)
-
-            lines = []
-            for combo in server.db.combo_lookup[elem.id]:
-                tick = all(elem in user.inv for elem in combo)
-                names = [server.db.elem_id_lookup[elem].name for elem in combo]
-                names.sort()
-                names[-1] = self.obfuscate(names[-1])
-                lines.append(obtain_emoji(tick) + " " + " + ".join(names))
+        elem, lines = await server.db.element_lock.read(
+            self.get_hint, server, user, element
+        )
 
         limit = get_page_limit(server, ctx.channel.id)
         embeds = generate_embed_list(
@@ -139,16 +144,9 @@ class Hint(commands.Cog):
 
         elem = await server.get_element_by_str(user, element)
 
-        async with server.db.element_lock.reader:
-            lines = []
-            sorter = lambda combo: server.db.combos[combo].id
-            for combo in sorted(server.db.used_in_lookup[elem.id], key=sorter):
-                result = server.db.combos[combo]
-                tick = result.id in user.inv
-                line = obtain_emoji(tick) + " " + result.name
-                if line not in lines:
-                    # In case multiple combos use this element for the same result
-                    lines.append(obtain_emoji(tick) + " " + result.name)
+        lines = await server.db.element_lock.read(
+            self.get_product_lines, server, user, elem
+        )
 
         unobtained_emoji = obtain_emoji(False)
         unobtained_lines = []
@@ -27,15 +27,8 @@ class Profiles(commands.Cog):
             value=user.mention,
             inline=False,
         )
-        leaderboard_position = (
-            sorted(
-                server.db.users.keys(),
-                key=lambda key: len(server.db.users[key].inv),
-                reverse=True,
-            ).index(logged_in.id)
-            + 1
-        )
         async with server.db.user_lock.reader:
+            leaderboard_position = server.db.rankings["inv"].get_rank(logged_in.id)
             if leaderboard_position == 1:
                 embed.add_field(
                     name="🥇 Leaderboard Position",
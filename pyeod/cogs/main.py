@@ -30,16 +30,28 @@ class Main(commands.Cog):
             self.restart_checker.start()
         if not self.achievement_checker.is_running():
             self.achievement_checker.start()
+        if not self.metrics_writer.is_running():
+            self.metrics_writer.start()
 
     @commands.Cog.listener()
     async def on_bridge_command(self, ctx: bridge.BridgeContext):
-        server = InstanceManager.current.get_or_create(ctx.guild.id)
+        self.bot.metrics.start(ctx)
+        manager = InstanceManager.current
+        if ctx.guild.id in manager.unloaded or ctx.guild.id in manager.failed:
+            return  # The command itself reports that the server can't be used
+        server = manager.get_or_create(ctx.guild.id)
         server.commands_used += 1
+        server.db.mark_changed()
+
+    @commands.Cog.listener()
+    async def on_bridge_command_completion(self, ctx: bridge.BridgeContext):
+        self.bot.metrics.finish(ctx)
 
     @commands.Cog.listener()
     async def on_bridge_command_error(
         self, ctx: bridge.BridgeContext, err: commands.errors.CommandError
     ):
+        self.bot.metrics.finish(ctx, err)
         # Handle different exceptions from parsing arguments here
         if isinstance(err, commands.errors.BadArgument):
             await ctx.respond("🔴 " + str(err))
@@ -155,12 +167,20 @@ class Main(commands.Cog):
             self.restart_checker.stop()
             await self.bot.close()
 
-    @tasks.loop(seconds=15, reconnect=True)
+    @tasks.loop(seconds=1, reconnect=True)
     async def achievement_checker(self):
-        for server in InstanceManager.current.instances.values():
-            for user in server.db.check_achievements_list:
-                await self.bot.award_achievements(server, user=user)
-            server.db.check_achievements_list = set()
+        for server in list(InstanceManager.current.instances.values()):
+            if not server.db.achievement_events:
+                continue
+            # Events can come in while awarding
+            pending = server.db.achievement_events
+            server.db.achievement_events = {}
+            for user, events in pending.items():
+                await self.bot.award_achievements(server, user=user, events=events)
+
+    @tasks.loop(seconds=config.METRICS_SECONDS, reconnect=True)
+    async def metrics_writer(self):
+        self.bot.metrics.write(config.metricsfile)
 
     @bridge.bridge_command()
     async def help(self, ctx: bridge.BridgeContext):
@@ -8,6 +8,7 @@ from pyeod.frontend import (
 )
 from discord.ext.bridge import bridge_option as option_decorator
 from discord.ext import bridge, commands
+from typing import List
 import io
 
 
@@ -15,6 +16,20 @@ class Path(commands.Cog):
     def __init__(self, bot: ElementalBot):
         self.bot = bot
 
+    def get_path_lines(self, server: DiscordGameInstance, path: List[int]) -> List[str]:
+        lines = []
+        i = 0
+        for pathelem in path:
+            combo = server.db.min_elem_tree[pathelem]
+            if not combo:
+                # Only starter elements should end up here
+                continue
+            i += 1
+            elements = [server.db.elem_id_lookup[x].name for x in combo]
+            result = server.db.elem_id_lookup[pathelem].name
+            lines.append(str(i) + ". " + " + ".join(elements) + " = " + result)
+        return lines
+
     @bridge.bridge_command()
     @bridge.guild_only()
     @option_decorator("element", autocomplete=autocomplete_elements)
@@ -22,7 +37,7 @@ class Path(commands.Cog):
         """Gives the step by step element creation towards a certain element.
         Ie. !path mud would `water+earth=mud`"""
         server = InstanceManager.current.get_or_create(ctx.guild.id)
-        if server.db.complexity_lock.reader.locked:
+        if server.db.complexity_lock.writer.locked:
             raise InternalError("Complexity lock", "Complexity calculations in process")
 
         logged_in = await server.login_user(ctx.author.id)
@@ -37,18 +52,7 @@ class Path(commands.Cog):
                 )
 
         path = await server.db.get_path(elem)
-        async with server.db.element_lock.reader:
-            lines = []
-            i = 0
-            for pathelem in path:
-                combo = server.db.min_elem_tree[pathelem]
-                if not combo:
-                    # Only starter elements should end up here
-                    continue
-                i += 1
-                elements = [server.db.elem_id_lookup[x].name for x in combo]
-                result = server.db.elem_id_lookup[pathelem].name
-                lines.append(str(i) + ". " + " + ".join(elements) + " = " + result)
+        lines = await server.db.element_lock.read(self.get_path_lines, server, path)
 
         stream = io.StringIO("\n".join(lines))
         user = await self.bot.fetch_user(ctx.author.id)
@@ -1,10 +1,13 @@
+from pyeod import config
 from pyeod.errors import InternalError
 from pyeod.frontend import DiscordGameInstance, ElementalBot, InstanceManager
+from pyeod.model import LRUCache
 from discord import Message, TextChannel, errors
 from discord.ext import bridge, commands, tasks
 from discord.utils import get
 from typing import Optional
 import traceback
+import asyncio
 
 
 class Polls(commands.Cog):
@@ -13,6 +16,8 @@ class Polls(commands.Cog):
 
     def __init__(self, bot: ElementalBot):
         self.bot = bot
+        # Reacted messages found not to be from the bot, to skip fetching again
+        self.checked_messages = LRUCache(1000)
         # self.check_polls.start()  # prevent double poll accepting
 
     # @tasks.loop(seconds=1, reconnect=True)
@@ -42,22 +47,35 @@ class Polls(commands.Cog):
     #         for message in messages:
     #             await self.resolve_poll(message, server, news_channel)
 
+    async def delete_stray_message(self, server: DiscordGameInstance, payload) -> None:
+        # Bot messages in the voting channel that aren't polls are old polls
+        if self.checked_messages.get(payload.message_id):
+            return
+        channel = await self.bot.get_server_channel(server, payload.channel_id)
+        message = await channel.fetch_message(payload.message_id)
+        if message.author.id == self.bot.user.id:
+            await message.delete()
+        else:
+            self.checked_messages.set(payload.message_id, True)
+
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload):
-        if payload.guild_id not in InstanceManager.current.instances:
-            return
-        server = InstanceManager.current.instances[payload.guild_id]
-        if server.channels.voting_channel != payload.channel_id:
+        manager = InstanceManager.current
+        if payload.guild_id not in manager:
             return
         if payload.user_id == self.bot.user.id:
             return
         if str(payload.emoji) not in [Polls.UPVOTE, Polls.DOWNVOTE]:
             return
+        channels = manager.get_channels(payload.guild_id)
+        if channels is not None and channels.voting_channel != payload.channel_id:
+            return
+        # Votes are kept rather than refused while the server loads
+        server = await manager.wait_instance(payload.guild_id)
+        if server.channels.voting_channel != payload.channel_id:
+            return
         if payload.message_id not in server.poll_msg_lookup:
-            channel = await self.bot.fetch_channel(payload.channel_id)
-            message = await channel.fetch_message(payload.message_id)
-            if message.author.id == self.bot.user.id:
-                await message.delete()
+            await self.delete_stray_message(server, payload)
             return
 
         if str(payload.emoji) == Polls.UPVOTE:
@@ -69,20 +87,22 @@ class Polls(commands.Cog):
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload):
-        if payload.guild_id not in InstanceManager.current.instances:
-            return
-        server = InstanceManager.current.instances[payload.guild_id]
-        if server.channels.voting_channel != payload.channel_id:
+        manager = InstanceManager.current
+        if payload.guild_id not in manager:
             return
         if payload.user_id == self.bot.user.id:
             return
         if str(payload.emoji) not in [Polls.UPVOTE, Polls.DOWNVOTE]:
             return
+        channels = manager.get_channels(payload.guild_id)
+        if channels is not None and channels.voting_channel != payload.channel_id:
+            return
+        # Votes are kept rather than refused while the server loads
+        server = await manager.wait_instance(payload.guild_id)
+        if server.channels.voting_channel != payload.channel_id:
+            return
         if payload.message_id not in server.poll_msg_lookup:
-            channel = await self.bot.fetch_channel(payload.channel_id)
-            message = await channel.fetch_message(payload.message_id)
-            if message.author.id == self.bot.user.id:
-                await message.delete()
+            await self.delete_stray_message(server, payload)
             return
 
         if str(payload.emoji) == Polls.UPVOTE:
@@ -90,48 +110,50 @@ class Polls(commands.Cog):
         else:
             server.downvoters[payload.message_id].add(payload.user_id)
         if payload.message_id in server.processing_polls:
+            # Counted by the batch already waiting on this poll
             return
         server.processing_polls.add(payload.message_id)
+        try:
+            # Let a burst of reactions come in and count them together
+            await asyncio.sleep(config.VOTE_BATCH_SECONDS)
+            await self.process_votes(server, payload.channel_id, payload.message_id)
+        finally:
+            server.processing_polls.remove(payload.message_id)
 
-        voters = (
-            server.upvoters[payload.message_id] ^ server.downvoters[payload.message_id]
-        )
-
+    async def process_votes(
+        self, server: DiscordGameInstance, channel_id: int, message_id: int
+    ) -> None:
         resolve_poll = False
-        author_downvote = False
         async with server.db.poll_lock.reader:
-            poll = server.poll_msg_lookup[payload.message_id]
-            if (
-                payload.user_id == poll.author.id
-                and str(payload.emoji) == Polls.DOWNVOTE
-            ):
-                author_downvote = True
-        poll.votes = len(server.upvoters[payload.message_id]) - len(
-            server.downvoters[payload.message_id]
-        )
+            if message_id not in server.poll_msg_lookup:
+                # Cleared while waiting
+                return
+            poll = server.poll_msg_lookup[message_id]
+        upvoters = server.upvoters[message_id]
+        downvoters = server.downvoters[message_id]
+        author_downvote = poll.author.id in downvoters
+        voters = upvoters ^ downvoters
+        poll.votes = len(upvoters) - len(downvoters)
+        server.db.mark_changed()
         if not author_downvote and abs(poll.votes) < server.vote_req:
             # Quit early
-            server.processing_polls.remove(payload.message_id)
             return
 
         try:
-            channel = await self.bot.fetch_channel(payload.channel_id)
-            message = await channel.fetch_message(payload.message_id)
-            await message.delete()
+            channel = await self.bot.get_server_channel(server, channel_id)
+            await channel.get_partial_message(message_id).delete()
             async with server.db.poll_lock.writer:
-                server.poll_msg_lookup.pop(payload.message_id)
-                server.upvoters.pop(payload.message_id)
-                server.downvoters.pop(payload.message_id)
+                server.poll_msg_lookup.pop(message_id)
+                server.upvoters.pop(message_id)
+                server.downvoters.pop(message_id)
+                server.db.mark_changed()
             if author_downvote:
                 async with server.db.user_lock.writer:
                     # Decrease active poll count
-                    author = await server.login_user(payload.user_id)
+                    author = await server.login_user(poll.author.id)
                     author.active_polls -= 1
+                    server.db.mark_changed()
             else:
-                # upvotes = get(message.reactions, emoji=Polls.UPVOTE)
-                # downvotes = get(message.reactions, emoji=Polls.DOWNVOTE)
-
-                # poll.votes = (upvotes.count if upvotes else 0) - (downvotes.count if downvotes else 0)
                 try:
                     resolve_poll = await server.check_single_poll(poll)
                 except InternalError as e:
@@ -142,8 +164,8 @@ class Polls(commands.Cog):
 
                 if resolve_poll:
                     if server.channels.news_channel is not None:
-                        news_channel = await self.bot.fetch_channel(
-                            server.channels.news_channel
+                        news_channel = await self.bot.get_server_channel(
+                            server, server.channels.news_channel
                         )
                         news_message = await poll.get_news_message(server)
                         if isinstance(news_message, tuple):  # (msg, embed)
@@ -157,20 +179,17 @@ class Polls(commands.Cog):
                         for voter in voters:
                             user = await server.login_user(voter)
                             user.votes_cast_count += 1
-
-            # Author deleted, or poll resolved
-            if resolve_poll:
-                for user_id in list(voters) + [poll.author.id]:
-                    user = await server.login_user(user_id)
-                    # await self.bot.award_achievements(server, user=user)
+                            server.db.rankings["votes"].set(
+                                user.id, user.votes_cast_count
+                            )
+                            server.db.add_achievement_event(user, "vote")
+                        server.db.mark_changed()
         except Exception as e:
             if isinstance(e, errors.NotFound):
                 return
             print("Ignored exception in resolve_poll")
             traceback.print_exception(type(e), e, e.__traceback__)
             return
-        finally:
-            server.processing_polls.remove(payload.message_id)
 
     @bridge.bridge_command()
     @bridge.guild_only()
@@ -181,7 +200,9 @@ class Polls(commands.Cog):
         # Prevent new polls
         async with server.db.poll_lock.writer:
             if server.channels.voting_channel is not None:
-                channel = await self.bot.fetch_channel(server.channels.voting_channel)
+                channel = await self.bot.get_server_channel(
+                    server, server.channels.voting_channel
+                )
                 for msg_id in server.poll_msg_lookup:
                     try:
                         message = await channel.fetch_message(msg_id)
@@ -195,6 +216,7 @@ class Polls(commands.Cog):
         async with server.db.user_lock.writer:
             for user in server.db.users.values():
                 user.active_polls = 0
+            server.db.mark_changed()
         # TODO: delete polls and notify in news
         await ctx.respond("🧹 Cleared polls!")
 
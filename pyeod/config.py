@@ -5,6 +5,7 @@ package_location = os.path.dirname(package)
 control = os.path.join(package, "control")
 stopfile = os.path.join(control, "stop")
 restartfile = os.path.join(control, "restart")
+metricsfile = os.path.join(control, "metrics")
 
 # Debug server used to test new commands
 MAIN_SERVER = 0
@@ -13,6 +14,24 @@ SERVER_CONTROL_USERS = [
     666999744572293170,  # cheesybrik
     274518100500676608,  # steyerofoam
 ]
+# Full snapshot every n saves, only the journal is written otherwise
+JOURNAL_COMPACT_SAVES = 20
+# Write snapshots in the packed columnar format, msgpack snapshots still load
+COLUMNAR_SNAPSHOTS = True
+# Servers unused for this long are dropped from memory until next needed
+INSTANCE_UNLOAD_SECONDS = 3600
+# Users per server with cached inventory stats for achievements
+ELEMENT_STATS_CACHE_SIZE = 1000
+# Recent combinations remembered per user, repeating one skips looking it up
+COMBO_CACHE_SIZE = 8
+# Votes on a poll within this long of each other are counted together
+VOTE_BATCH_SECONDS = 0.5
+# Command metrics are written for the control server this often
+METRICS_SECONDS = 15
+# Database locks held at least this long are logged, see lock_stats
+LOCK_SLOW_SECONDS = 0.25
+# Slow lock holds remembered per lock
+LOCK_SLOW_LOG_SIZE = 100
 EMBED_COLOR = 0x3499EB
 IMAGE_TYPES = [
     "image/png",
@@ -1,5 +1,6 @@
 from pyeod import config
-from flask import Flask
+from flask import Flask, Response
+import os
 import sys
 import subprocess
 
@@ -11,6 +12,7 @@ def index():
     return """
     Bot is running<br>Refresh this page to update<br>
     <a href='/stop'>Stop</a> <a href='/restart'>Restart</a>
+    <a href='/metrics'>Metrics</a>
     """
 
 
@@ -33,6 +35,15 @@ def update():
     return "Updating bot"
 
 
+@app.route("/metrics")
+def metrics():
+    # Written by the bot every config.METRICS_SECONDS
+    if not os.path.isfile(config.metricsfile):
+        return Response("", mimetype="text/plain")
+    with open(config.metricsfile) as f:
+        return Response(f.read(), mimetype="text/plain; version=0.0.4")
+
+
 def run_webserver():
     proc = subprocess.Popen([sys.executable, "-m", __name__])
     return proc
@@ -11,7 +11,7 @@ __all__ = [
 ]
 
 from pyeod.errors import GameError, InternalError
-from pyeod.frontend.model import DiscordGameInstance, InstanceManager
+from pyeod.frontend.model import CommandMetrics, DiscordGameInstance, InstanceManager
 from pyeod.frontend.utils import generate_embed_list, get_page_limit
 from pyeod.model import Poll, User
 from pyeod.utils import calculate_difficulty, format_list, obtain_emoji
@@ -22,12 +22,15 @@ from discord import (
     Interaction,
     Message,
     SelectOption,
+    TextChannel,
     errors,
     ui,
 )
 from discord.ext.pages import Paginator, PaginatorButton
 from discord.ext import bridge
+from typing import List, Optional, Set, Tuple
 import random
+import math
 
 
 class FooterPaginator(Paginator):
@@ -77,7 +80,51 @@ class FooterPaginator(Paginator):
                 raise
 
 
-async def create_leaderboard(sorting_option, ctx, user):
+# Leaderboard name to key in Database.rankings
+leaderboard_rankings = {
+    "Elements Made": "inv",
+    "Elements Suggested": "suggested",
+    "Combos Suggested": "combos",
+    "Votes Cast": "votes",
+    "Achievements Earned": "achievements",
+    "Elements Marked": "marked",
+    "Elements Imaged": "imaged",
+    "Elements Colored": "colored",
+    "Elements Iconed": "iconed",
+}
+
+
+def get_leaderboard_lines(
+    server: DiscordGameInstance,
+    sorting_option: str,
+    logged_in: Optional[User],
+    start: int,
+    count: int,
+) -> Tuple[List[str], int, int]:
+    ranking = server.db.rankings[leaderboard_rankings[sorting_option]]
+    lines = []
+    user_index = -1
+    user_inv = 0
+    if logged_in is not None:
+        user_index = ranking.get_rank(logged_in.id)
+        user_inv = ranking.values[logged_in.id]
+
+    # Already in order, only the requested page is formatted
+    ranks = ranking.get_range(start, start + count)
+    for i, (user_id, player_value) in enumerate(ranks, start + 1):
+        player = server.db.users[user_id]
+        if i == user_index:
+            lines.append(
+                f"{i}\\. {server.get_icon(player.icon)} <@{user_id}> *You* - {player_value:,}"
+            )
+        else:
+            lines.append(
+                f"{i}\\. {server.get_icon(player.icon)} <@{user_id}> - {player_value:,}"
+            )
+    return lines, user_index, user_inv
+
+
+async def create_leaderboard(sorting_option, ctx, user, page_number=0):
     server = InstanceManager.current.get_or_create(ctx.guild.id)
     # Don't add new user to db
     if user.id in server.db.users:
@@ -86,70 +133,33 @@ async def create_leaderboard(sorting_option, ctx, user):
         logged_in = None
 
     # Handle the interaction here
-    async with server.db.user_lock.reader:
-        lines = []
-        user_index = -1
-        user_inv = 0
-        i = 0
-        find_value = None
-        title = "Top " + sorting_option
-        if sorting_option == "Elements Made":
-            find_value = lambda user: len(user.inv)
-        elif sorting_option == "Elements Suggested":
-            find_value = lambda user: len(server.db.created_by_lookup[user.id])
-        elif sorting_option == "Combos Suggested":
-            find_value = lambda user: user.created_combo_count
-        elif sorting_option == "Votes Cast":
-            find_value = lambda user: user.votes_cast_count
-        elif sorting_option == "Achievements Earned":
-            find_value = lambda user: len(user.achievements)
-        # TODO - Check how inefficient these are is and make better if it's bad
-        elif sorting_option == "Elements Marked":
-            markers = [i.marker for i in server.db.elem_id_lookup.values() if i.marker]
-            find_value = lambda user: markers.count(user)
-        elif sorting_option == "Elements Imaged":
-            imagers = [i.imager for i in server.db.elem_id_lookup.values() if i.imager]
-            find_value = lambda user: imagers.count(user)
-        elif sorting_option == "Elements Colored":
-            colorers = [
-                i.colorer for i in server.db.elem_id_lookup.values() if i.colorer
-            ]
-            find_value = lambda user: colorers.count(user)
-        elif sorting_option == "Elements Iconed":
-            iconers = [i.iconer for i in server.db.elem_id_lookup.values() if i.iconer]
-            find_value = lambda user: iconers.count(user)
-        else:
-            raise GameError("Invalid sort", "Failed to find sort function")
-
-        for user_id, player in sorted(
-            server.db.users.items(),
-            key=lambda pair: find_value(pair[1]),
-            reverse=True,
-        ):
-            i += 1
-            player_value = find_value(player)
-            if logged_in is not None and user_id == logged_in.id:
-                user_index = i
-                user_inv = player_value
-                lines.append(
-                    f"{i}\\. {server.get_icon(player.icon)} <@{user_id}> *You* - {player_value:,}"
-                )
-            else:
-                lines.append(
-                    f"{i}\\. {server.get_icon(player.icon)} <@{user_id}> - {player_value:,}"
-                )
-
+    if sorting_option not in leaderboard_rankings:
+        raise GameError("Invalid sort", "Failed to find sort function")
+    title = "Top " + sorting_option
     limit = get_page_limit(server, ctx.channel.id)
-    pages = generate_embed_list(lines, title, limit)
-    for page in pages:
-        page.add_field(name=f"\nYou are #{user_index} on this leaderboard", value="")
+    ranking = server.db.rankings[leaderboard_rankings[sorting_option]]
+    page_count = max(math.ceil(len(ranking) / limit), 1)
+    page_number = min(page_number, page_count - 1)
+    lines, user_index, user_inv = await server.db.user_lock.read(
+        get_leaderboard_lines,
+        server,
+        sorting_option,
+        logged_in,
+        page_number * limit,
+        limit,
+    )
+
+    page = generate_embed_list(lines, title, limit)[0]
+    page.add_field(name=f"\nYou are #{user_index} on this leaderboard", value="")
     if logged_in is not None:
-        for page in pages:
-            if f"<@{logged_in.id}>" not in page.description:
-                profile_name = f"{server.get_icon(logged_in.icon)} <@{logged_in.id}>"
-                page.description += (
-                    f"\n\n{user_index}\\. {profile_name} *You* - {user_inv:,}"
-                )
+        if f"<@{logged_in.id}>" not in page.description:
+            profile_name = f"{server.get_icon(logged_in.icon)} <@{logged_in.id}>"
+            page.description += (
+                f"\n\n{user_index}\\. {profile_name} *You* - {user_inv:,}"
+            )
+    # Other pages are only formatted when shown, see LeaderboardPaginator
+    pages = [Embed(title=title)] * page_count
+    pages[page_number] = page
     return pages
 
 
@@ -215,14 +225,8 @@ class SortingDropdown(ui.Select):
         ctx = self.paginator.ctx
         user = self.paginator.target_user
 
-        pages = await create_leaderboard(self.values[0], ctx, user)
-
-        self.paginator.pages = pages
-        self.paginator.current_page = 0
-
-        await self.paginator.goto_page(
-            self.paginator.current_page, interaction=interaction
-        )
+        self.paginator.sorting_option = self.values[0]
+        await self.paginator.goto_page(0, interaction=interaction)
 
 
 class LeaderboardPaginator(FooterPaginator):
@@ -233,6 +237,18 @@ class LeaderboardPaginator(FooterPaginator):
         self.show_menu = True
         self.ctx = ctx
         self.target_user = user
+        self.sorting_option = "Elements Made"
+
+    async def goto_page(self, page_number=0, *, interaction=None):
+        # Pages are formatted when shown, so they are also up to date
+        self.pages = await create_leaderboard(
+            self.sorting_option, self.ctx, self.target_user, page_number
+        )
+        self.page_count = len(self.pages) - 1
+        page_number = min(page_number, self.page_count)  # Fewer users now
+        return await super(LeaderboardPaginator, self).goto_page(
+            page_number, interaction=interaction
+        )
 
     def add_menu(self):
         self.menu = SortingDropdown()
@@ -389,7 +405,7 @@ class ElementPaginator(FooterPaginator):
                     elem.name
                     for elem in sorted(
                         elements,
-                        key=lambda elem: len(server.db.path_lookup[elem.id]),
+                        key=lambda elem: server.db.tree_sizes[elem.id],
                         reverse=True,
                     )
                 ]
@@ -399,7 +415,7 @@ class ElementPaginator(FooterPaginator):
                     for elem in sorted(
                         elements,
                         key=lambda elem: calculate_difficulty(
-                            len(server.db.path_lookup[elem.id]),
+                            server.db.tree_sizes[elem.id],
                             server.db.complexities[elem.id],
                         ),
                         reverse=True,
@@ -473,10 +489,10 @@ async def create_element_leaderboard(sorting_option, ctx, user, start, end):
         if sorting_option == "Tier":
             find_value = lambda element: server.db.complexities[element.id]
         elif sorting_option == "Tree Size":
-            find_value = lambda element: len(server.db.path_lookup[element.id])
+            find_value = lambda element: server.db.tree_sizes[element.id]
         elif sorting_option == "Difficulty":
             find_value = lambda element: calculate_difficulty(
-                len(server.db.path_lookup[element.id]),
+                server.db.tree_sizes[element.id],
                 server.db.complexities[element.id],
             )
         elif sorting_option == "Made With":
@@ -598,6 +614,10 @@ class ElementLeaderboardPaginator(FooterPaginator):
 
 #! Sharding Removed, to add back in - bridge.AutoShardedBot
 class ElementalBot(bridge.Bot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = CommandMetrics()
+
     async def on_connect(self):
         if self.auto_sync_commands:
             try:
@@ -608,6 +628,17 @@ class ElementalBot(bridge.Bot):
                 else:
                     raise
 
+    async def get_server_channel(
+        self, server: DiscordGameInstance, channel_id: int
+    ) -> TextChannel:
+        # Fetched once per server until its channels are changed
+        if channel_id not in server.channel_cache:
+            channel = self.get_channel(channel_id)
+            if channel is None:
+                channel = await self.fetch_channel(channel_id)
+            server.channel_cache[channel_id] = channel
+        return server.channel_cache[channel_id]
+
     async def add_poll(
         self,
         server: DiscordGameInstance,
@@ -623,7 +654,9 @@ class ElementalBot(bridge.Bot):
                     "News channel unset",
                     "Please set the news channel before adding polls",
                 )
-            news_channel = await self.fetch_channel(server.channels.news_channel)
+            news_channel = await self.get_server_channel(
+                server, server.channels.news_channel
+            )
             news_message = await poll.get_news_message(server)
             if isinstance(news_message, tuple):  # (msg, embed)
                 await news_channel.send(news_message[0], embed=news_message[1])
@@ -635,24 +668,32 @@ class ElementalBot(bridge.Bot):
                     "Voting channel unset",
                     "Please set the voting channel before adding polls",
                 )
-            voting_channel = await self.fetch_channel(server.channels.voting_channel)
+            voting_channel = await self.get_server_channel(
+                server, server.channels.voting_channel
+            )
             poll_msg = await voting_channel.send(
                 embed=await server.convert_poll_to_embed(poll)
             )
             server.poll_msg_lookup[poll_msg.id] = poll
             server.upvoters[poll_msg.id] = set()
             server.downvoters[poll_msg.id] = set()
+            server.db.mark_changed()
             await poll_msg.add_reaction("\U0001F53C")  # ⬆️ Emoji
             await poll_msg.add_reaction("\U0001F53D")
 
     async def award_achievements(
-        self, server: DiscordGameInstance, msg: Message = None, user: User = None
+        self,
+        server: DiscordGameInstance,
+        msg: Message = None,
+        user: User = None,
+        events: Optional[Set[str]] = None,
     ):
         if msg is not None:
             user = await server.login_user(msg.author.id)
-        new_achievements = await server.get_achievements(user)
+        new_achievements = await server.get_achievements(user, events)
 
         unlocked_icons = []
+        news_lines = []
 
         for achievement in new_achievements:
             name = await server.get_achievement_name(achievement)
@@ -660,16 +701,25 @@ class ElementalBot(bridge.Bot):
                 await msg.reply(
                     f"🌟 Achievement unlocked: **{name}**"
                 )
-            if server.channels.news_channel is not None:
-                news_channel = await self.fetch_channel(server.channels.news_channel)
-                await news_channel.send(
-                    f"🌟 <@{user.id}> Achievement unlocked: **{name}**"
-                )
+            news_lines.append(f"🌟 <@{user.id}> Achievement unlocked: **{name}**")
             unlocked_icons += [
                 server.get_icon(icon)
                 for icon in await server.get_unlocked_icons(achievement)
             ]
 
+        if news_lines and server.channels.news_channel is not None:
+            news_channel = await self.get_server_channel(
+                server, server.channels.news_channel
+            )
+            # One message for all of them, split to fit the length limit
+            chunk = []
+            for line in news_lines:
+                if chunk and len("\n".join(chunk + [line])) > 2000:
+                    await news_channel.send("\n".join(chunk))
+                    chunk = []
+                chunk.append(line)
+            await news_channel.send("\n".join(chunk))
+
         if msg is not None and unlocked_icons:
             if len(unlocked_icons) == 1:
                 await msg.reply(f"✨ Icon unlocked: {unlocked_icons[0]}")
@@ -681,19 +731,14 @@ class ElementalBot(bridge.Bot):
 
 async def autocomplete_elements(ctx: AutocompleteContext):
     server = InstanceManager.current.get_or_create(ctx.interaction.guild.id)
-    names = []
-    async with server.db.element_lock.reader:
-        for element in server.db.elements:
-            if ctx.value.lower() in element:
-                names.append(server.db.elements[element].name)
-        return names
+    db = server.db
+    return await db.element_lock.read(
+        lambda: [db.elements[name].name for name in db.element_index.search(ctx.value)]
+    )
 
 
 async def autocomplete_categories(ctx: AutocompleteContext):
     server = InstanceManager.current.get_or_create(ctx.interaction.guild.id)
-    names = []
     async with server.db.category_lock.reader:
-        for category in server.db.categories:
-            if ctx.value.lower() in category:
-                names.append(server.db.categories[category].name)
-        return names
+        names = server.db.category_index.search(ctx.value)
+        return [server.db.categories[name].name for name in names]
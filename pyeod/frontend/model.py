@@ -1,7 +1,13 @@
-__all__ = ["ChannelList", "DiscordGameInstance", "InstanceManager"]
+__all__ = [
+    "ChannelList",
+    "DiscordGameInstance",
+    "InstanceManager",
+    "LatencyHistogram",
+    "CommandMetrics",
+]
 
 from pyeod import config
-from pyeod.errors import InternalError
+from pyeod.errors import GameError, InternalError
 from pyeod.model import (
     ColorPoll,
     Database,
@@ -14,6 +20,11 @@ from pyeod.model import (
 from discord import Embed
 from typing import Dict, List, Tuple, Union, TypeVar, Optional
 from contextlib import contextmanager
+import os
+import time
+import bisect
+import asyncio
+import traceback
 
 
 class ChannelList:
@@ -59,6 +70,8 @@ class DiscordGameInstance(GameInstance):
         self.upvoters = {id: set() for id in self.poll_msg_lookup}
         self.downvoters = {id: set() for id in self.poll_msg_lookup}
         self.processing_polls = set()
+        # Channel objects by ID, see ElementalBot.get_server_channel
+        self.channel_cache = {}
 
     def convert_to_dict(self, data: dict) -> None:
         super(DiscordGameInstance, self).convert_to_dict(data)
@@ -139,6 +152,14 @@ class InstanceManager:
             self.instances = instances
         else:
             self.instances = {}
+        # Idle instances are dropped from memory and loaded again on demand
+        self.unloaded: Dict[int, str] = {}
+        self.loading: Dict[int, asyncio.Task] = {}
+        # Files that failed to load, kept so they are not replaced by new data
+        self.failed: Dict[int, str] = {}
+        # Kept so traffic in other channels is ignored without a load
+        self.unloaded_channels: Dict[int, ChannelList] = {}
+        self.last_used: Dict[int, float] = {}
         self.creation_lock = False
 
     @property
@@ -161,28 +182,115 @@ class InstanceManager:
         return self.get_instance(id)
 
     def add_instance(self, id: int, instance: DiscordGameInstance) -> None:
-        if id in self.instances:
+        if self.has_instance(id):
             raise InternalError(
                 "Instance overwrite", "GameInstance already exists with given ID"
             )
         self.instances[id] = instance
+        self.last_used[id] = time.monotonic()
 
     def has_instance(self, id: int) -> bool:
-        return id in self.instances
+        return id in self.instances or id in self.unloaded or id in self.failed
 
     def get_instance(self, id: int) -> DiscordGameInstance:
+        if id in self.unloaded:
+            # Decoding blocks for seconds, so never on the event loop
+            self.start_loading(id)
+            raise GameError(
+                "Instance loading",
+                "This server is still loading, try again in a few seconds",
+            )
+        if id in self.failed:
+            raise InternalError(
+                "Instance load failed",
+                f"Could not load {os.path.basename(self.failed[id])}, "
+                "it must be fixed or reset",
+            )
         if id not in self.instances:
             raise InternalError(
                 "Instance not found", "The requested GameInstance not found"
             )
+        self.last_used[id] = time.monotonic()
         return self.instances[id]
 
+    async def wait_instance(self, id: int) -> DiscordGameInstance:
+        if id in self.unloaded:
+            await self.start_loading(id)
+        return self.get_instance(id)
+
+    def start_loading(self, id: int) -> asyncio.Task:
+        if id not in self.loading:
+            task = asyncio.get_running_loop().create_task(self.load(id))
+            self.loading[id] = task
+        return self.loading[id]
+
+    async def load(self, id: int) -> None:
+        # Imported here as pyeod.packer depends on this module
+        from pyeod.packer import load_instance, prepare_instance
+
+        file = self.unloaded[id]
+        try:
+            loop = asyncio.get_running_loop()
+            instance = await loop.run_in_executor(None, load_instance, file)
+            await prepare_instance(instance, file)
+        except Exception as e:
+            print("Failed loading", os.path.basename(file))
+            traceback.print_exception(type(e), e, e.__traceback__)
+            # Not retried, get_instance reports it instead
+            if self.unloaded.get(id) == file:
+                del self.unloaded[id]
+                self.unloaded_channels.pop(id, None)
+                self.failed[id] = file
+            return
+        finally:
+            del self.loading[id]
+        # Not handed out before the complexities are calculated
+        if self.unloaded.get(id) == file:
+            self.add_loaded_instance(id, instance)
+
+    def add_loaded_instance(self, id: int, instance: DiscordGameInstance) -> None:
+        # Loaded outside of get_instance, e.g. in a background thread
+        if id not in self.unloaded:
+            raise InternalError(
+                "Instance not found", "The requested GameInstance is not unloaded"
+            )
+        del self.unloaded[id]
+        self.unloaded_channels.pop(id, None)
+        self.instances[id] = instance
+        self.last_used[id] = time.monotonic()
+
     def remove_instance(self, id: int) -> None:
+        if not self.has_instance(id):
+            raise InternalError(
+                "Instance not found", "The requested GameInstance not found"
+            )
+        self.instances.pop(id, None)
+        self.unloaded.pop(id, None)
+        self.unloaded_channels.pop(id, None)
+        self.failed.pop(id, None)
+        self.last_used.pop(id, None)
+
+    def is_idle(self, id: int, seconds: float) -> bool:
+        return time.monotonic() - self.last_used.get(id, 0) > seconds
+
+    def unload_instance(self, id: int, file: str) -> None:
+        """
+        Drop an instance from memory, it is loaded from ``file``
+        the next time it is requested. The file must be up to date.
+
+        """
         if id not in self.instances:
             raise InternalError(
                 "Instance not found", "The requested GameInstance not found"
             )
-        self.instances.pop(id)
+        self.unloaded_channels[id] = self.instances.pop(id).channels
+        self.unloaded[id] = file
+
+    def get_channels(self, id: int) -> Optional[ChannelList]:
+        # None for instances not loaded since startup
+        if id in self.instances:
+            return self.instances[id].channels
+        return self.unloaded_channels.get(id)
 
     def get_or_create(self, id: int) -> DiscordGameInstance:
         if not self.has_instance(id):
@@ -196,3 +304,131 @@ class InstanceManager:
         else:
             instance = self.get_instance(id)
         return instance
+
+
+class LatencyHistogram:
+    # Upper bounds in seconds, the last bucket is unbounded
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> List[str]:
+        lines = []
+        cumulative = 0
+        bounds = [str(bound) for bound in self.BUCKETS] + ["+Inf"]
+        for bound, count in zip(bounds, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {self.total}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class CommandMetrics:
+    """
+    Latencies, error counts and rates of commands, per command and
+    per guild. Rendered in the Prometheus text format and written to
+    ``config.metricsfile`` for the control server to serve.
+
+    """
+
+    def __init__(self) -> None:
+        self.commands: Dict[str, LatencyHistogram] = {}
+        self.guilds: Dict[int, LatencyHistogram] = {}
+        # Command name and exception type to count
+        self.errors: Dict[Tuple[str, str], int] = {}
+        # Totals at the last render, to give rates since then
+        self.last_render = time.monotonic()
+        self.last_counts: Dict[str, int] = {}
+        self.last_errors: Dict[str, int] = {}
+
+    def record(
+        self,
+        name: str,
+        guild_id: int,
+        seconds: float,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        if name not in self.commands:
+            self.commands[name] = LatencyHistogram()
+        self.commands[name].observe(seconds)
+        if guild_id not in self.guilds:
+            self.guilds[guild_id] = LatencyHistogram()
+        self.guilds[guild_id].observe(seconds)
+        if error is not None:
+            key = (name, type(error).__name__)
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    def start(self, ctx) -> None:
+        ctx.metrics_start = time.perf_counter()
+
+    def finish(self, ctx, error: Optional[BaseException] = None) -> None:
+        start = getattr(ctx, "metrics_start", None)
+        if start is None:
+            # Errors from outside of commands, e.g. the message handler
+            return
+        del ctx.metrics_start
+        guild_id = ctx.guild.id if ctx.guild is not None else 0
+        name = ctx.command.qualified_name
+        self.record(name, guild_id, time.perf_counter() - start, error)
+
+    @contextmanager
+    def measure(self, name: str, guild_id: int):
+        tic = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record(name, guild_id, time.perf_counter() - tic, e)
+            raise
+        self.record(name, guild_id, time.perf_counter() - tic)
+
+    def render(self) -> str:
+        now = time.monotonic()
+        interval = max(now - self.last_render, 1e-9)
+        self.last_render = now
+
+        lines = ["# TYPE pyeod_command_seconds histogram"]
+        for name, histogram in sorted(self.commands.items()):
+            lines += histogram.render("pyeod_command_seconds", f'command="{name}"')
+        lines.append("# TYPE pyeod_guild_command_seconds histogram")
+        for guild_id, histogram in sorted(self.guilds.items()):
+            lines += histogram.render(
+                "pyeod_guild_command_seconds", f'guild="{guild_id}"'
+            )
+
+        lines.append("# TYPE pyeod_command_errors_total counter")
+        error_counts = {}
+        for (name, error), count in sorted(self.errors.items()):
+            lines.append(
+                f'pyeod_command_errors_total{{command="{name}",error="{error}"}} '
+                f"{count}"
+            )
+            error_counts[name] = error_counts.get(name, 0) + count
+
+        # Per second since the last render
+        lines.append("# TYPE pyeod_command_rate gauge")
+        for name, histogram in sorted(self.commands.items()):
+            rate = (histogram.count - self.last_counts.get(name, 0)) / interval
+            lines.append(f'pyeod_command_rate{{command="{name}"}} {rate:.4f}')
+            self.last_counts[name] = histogram.count
+        lines.append("# TYPE pyeod_command_error_rate gauge")
+        for name, count in sorted(error_counts.items()):
+            rate = (count - self.last_errors.get(name, 0)) / interval
+            lines.append(f'pyeod_command_error_rate{{command="{name}"}} {rate:.4f}')
+            self.last_errors[name] = count
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        # Replaced in one go so the control server never reads half a file
+        temp = path + ".tmp"
+        with open(temp, "w") as f:
+            f.write(self.render())
+        os.replace(temp, path)
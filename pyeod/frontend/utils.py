@@ -59,7 +59,7 @@ def get_multiplier(text, fallback=None):
 async def build_info_embed(
     instance: GameInstance, element: Element, user: User
 ) -> Embed:
-    if instance.db.complexity_lock.reader.locked:
+    if instance.db.complexity_lock.writer.locked:
         raise InternalError("Complexity lock", "Complexity calculations in process")
 
     description = f"Element **#{element.id}**\n"
@@ -84,13 +84,17 @@ async def build_info_embed(
     else:
         timestamp = f"<t:{element.created}>"
 
-    tree_size = len(instance.db.path_lookup[element.id])
+    tree_size = instance.db.tree_sizes[element.id]
 
-    async with instance.db.element_lock.reader:
-        complexity = instance.db.complexities[element.id]
-        made_with = len(instance.db.combo_lookup[element.id])
-        used_in = len(instance.db.used_in_lookup[element.id])
-        found_by = len(instance.db.found_by_lookup[element.id])
+    db = instance.db
+    complexity, made_with, used_in, found_by = await db.element_lock.read(
+        lambda: (
+            db.complexities[element.id],
+            len(db.combo_lookup[element.id]),
+            len(db.used_in_lookup[element.id]),
+            len(db.found_by_lookup[element.id]),
+        )
+    )
 
     if element.mark:
         description += element.mark
@@ -116,7 +120,7 @@ async def build_info_embed(
         # In case they didn't use the shortest path
         progress = "100.00%"
     else:
-        progress_set = instance.db.path_lookup[element.id] & set(user.inv)
+        progress_set = instance.db.get_tree(element.id) & user.inv.lookup
         progress = f"{len(progress_set) / tree_size * 100:.2f}%"
 
     categories = []
@@ -10,10 +10,6 @@ from pyeod.utils import calculate_difficulty
 
 __all__ = ["achievements", "user_icons"]
 
-# TODO Cache more shit so achievement check doesn't bog element making
-element_stats_cache = {}
-element_info_cache = {}
-
 
 def boundary_list_check(boundaries, value):
     if value >= boundaries[-1]:
@@ -32,60 +28,28 @@ def get_nearest_boundary(boundaries, value):
 
 
 async def cache_element_stats(instance, user):
-    if id(instance) not in element_stats_cache:
-        element_stats_cache[id(instance)] = {}
-    if user.id not in element_stats_cache[id(instance)]:
-        element_stats_cache[id(instance)][user.id] = {
+    # Only elements added since the last call are checked
+    stats = instance.db.element_stats_cache.get(user.id)
+    if stats is None:
+        stats = {
             "last_checked_inv_pos": 0,
             "highest_complexity": 0,
             "highest_tree_size": 0,
             "highest_difficulty": 0,
         }
-    for element_id in user.inv[
-        element_stats_cache[id(instance)][user.id]["last_checked_inv_pos"] :
-    ]:
+        instance.db.element_stats_cache.set(user.id, stats)
+    for element_id in user.inv[stats["last_checked_inv_pos"] :]:
         complexity = instance.db.complexities[element_id]
-        if (
-            complexity
-            > element_stats_cache[id(instance)][user.id]["highest_complexity"]
-        ):
-            element_stats_cache[id(instance)][user.id][
-                "highest_complexity"
-            ] = complexity
-        tree_size = len(instance.db.path_lookup[element_id])
-        if tree_size > element_stats_cache[id(instance)][user.id]["highest_tree_size"]:
-            element_stats_cache[id(instance)][user.id]["highest_tree_size"] = tree_size
+        if complexity > stats["highest_complexity"]:
+            stats["highest_complexity"] = complexity
+        tree_size = instance.db.tree_sizes[element_id]
+        if tree_size > stats["highest_tree_size"]:
+            stats["highest_tree_size"] = tree_size
         difficulty = calculate_difficulty(tree_size, complexity)
-        if (
-            difficulty
-            > element_stats_cache[id(instance)][user.id]["highest_difficulty"]
-        ):
-            element_stats_cache[id(instance)][user.id][
-                "highest_difficulty"
-            ] = difficulty
-    element_stats_cache[id(instance)][user.id]["last_checked_inv_pos"] = (
-        len(user.inv) - 1
-    )
-
-
-async def cache_element_info(instance, user):
-    if id(instance) not in element_info_cache:
-        element_info_cache[id(instance)] = {}
-    element_info_cache[id(instance)][user.id] = {
-        "elements_imaged": 0,
-        "elements_colored": 0,
-        "elements_iconed": 0,
-        "elements_marked": 0,
-    }
-    for element in instance.db.elements.values():
-        if element.imager == user:
-            element_info_cache[id(instance)][user.id]["elements_imaged"] += 1
-        if element.colorer == user:
-            element_info_cache[id(instance)][user.id]["elements_colored"] += 1
-        if element.iconer == user:
-            element_info_cache[id(instance)][user.id]["elements_iconed"] += 1
-        if element.marker == user:
-            element_info_cache[id(instance)][user.id]["elements_marked"] += 1
+        if difficulty > stats["highest_difficulty"]:
+            stats["highest_difficulty"] = difficulty
+    stats["last_checked_inv_pos"] = len(user.inv)
+    return stats
 
 
 elements_collected_boundaries = [
@@ -166,14 +130,7 @@ async def votes_cast_progress(instance, user):
 
 async def leaderboard_pos_check(instance, user):
     async with instance.db.user_lock.reader:
-        leaderboard_position = (
-            sorted(
-                instance.db.users.keys(),
-                key=lambda key: len(instance.db.users[key].inv),
-                reverse=True,
-            ).index(user.id)
-            + 1
-        )
+        leaderboard_position = instance.db.rankings["inv"].get_rank(user.id)
         if leaderboard_position == 1:
             return 3
         if leaderboard_position == 2:
@@ -187,14 +144,7 @@ async def leaderboard_pos_check(instance, user):
 
 async def leaderboard_pos_progress(instance, user):
     async with instance.db.user_lock.reader:
-        leaderboard_position = (
-            sorted(
-                instance.db.users.keys(),
-                key=lambda key: len(instance.db.users[key].inv),
-                reverse=True,
-            ).index(user.id)
-            + 1
-        )
+        leaderboard_position = instance.db.rankings["inv"].get_rank(user.id)
         if leaderboard_position == 1:
             return (0, 1)
         if leaderboard_position == 2:
@@ -206,21 +156,15 @@ async def leaderboard_pos_progress(instance, user):
         return (10, leaderboard_position)
 
 
-async def achievement_achievement_check(
-    instance, user
-):  # Hijack achievements to cache shit
-    async with instance.db.user_lock.reader, instance.db.element_lock.reader:
-        await cache_element_info(instance, user)
-        await cache_element_stats(instance, user)
+async def achievement_achievement_check(instance, user):
+    async with instance.db.user_lock.reader:
         achievement_amount = len(user.achievements)
         if achievement_amount > 0:
             return achievement_amount // 10
 
 
 async def achievement_achievement_progress(instance, user):
-    async with instance.db.user_lock.reader, instance.db.element_lock.reader:
-        await cache_element_info(instance, user)
-        await cache_element_stats(instance, user)
+    async with instance.db.user_lock.reader:
         achievement_amount = len(user.achievements)
         return ((achievement_amount // 10 + 1) * 10, achievement_amount)
 
@@ -237,31 +181,13 @@ element_ids_in_a_row_boundaries = [
 
 async def element_ids_in_a_row_check(instance, user):
     async with instance.db.user_lock.reader:
-        highest_in_a_row = 0
-        id_to_check = 0
-        while highest_in_a_row < len(user.inv):
-            id_to_check += 1
-            # Missing Element Ids
-            if instance.db.elem_id_lookup.get(id_to_check) is None:
-                continue
-            if sorted(user.inv)[highest_in_a_row] != id_to_check:
-                break
-            highest_in_a_row += 1
+        highest_in_a_row = instance.db.get_ids_in_a_row(user)
         return boundary_list_check(element_ids_in_a_row_boundaries, highest_in_a_row)
 
 
 async def element_ids_in_a_row_progress(instance, user):
     async with instance.db.user_lock.reader:
-        highest_in_a_row = 0
-        id_to_check = 0
-        while highest_in_a_row < len(user.inv):
-            id_to_check += 1
-            # Missing Element Ids
-            if instance.db.elem_id_lookup.get(id_to_check) is None:
-                continue
-            if sorted(user.inv)[highest_in_a_row] != id_to_check:
-                break
-            highest_in_a_row += 1
+        highest_in_a_row = instance.db.get_ids_in_a_row(user)
         return get_nearest_boundary(element_ids_in_a_row_boundaries, highest_in_a_row)
 
 
@@ -284,7 +210,7 @@ async def mark_check(instance, user):
     async with instance.db.user_lock.reader:
         return boundary_list_check(
             editable_element_info_boundaries,
-            element_info_cache[id(instance)][user.id]["elements_marked"],
+            instance.db.get_contribution_count("marked", user),
         )
 
 
@@ -292,7 +218,7 @@ async def mark_progress(instance, user):
     async with instance.db.user_lock.reader:
         return get_nearest_boundary(
             editable_element_info_boundaries,
-            element_info_cache[id(instance)][user.id]["elements_marked"],
+            instance.db.get_contribution_count("marked", user),
         )
 
 
@@ -300,7 +226,7 @@ async def image_check(instance, user):
     async with instance.db.user_lock.reader:
         return boundary_list_check(
             editable_element_info_boundaries,
-            element_info_cache[id(instance)][user.id]["elements_imaged"],
+            instance.db.get_contribution_count("imaged", user),
         )
 
 
@@ -308,7 +234,7 @@ async def image_progress(instance, user):
     async with instance.db.user_lock.reader:
         return get_nearest_boundary(
             editable_element_info_boundaries,
-            element_info_cache[id(instance)][user.id]["elements_imaged"],
+            instance.db.get_contribution_count("imaged", user),
         )
 
 
@@ -316,7 +242,7 @@ async def color_check(instance, user):
     async with instance.db.user_lock.reader:
         return boundary_list_check(
             editable_element_info_boundaries,
-            element_info_cache[id(instance)][user.id]["elements_colored"],
+            instance.db.get_contribution_count("colored", user),
         )
 
 
@@ -324,7 +250,7 @@ async def color_progress(instance, user):
     async with instance.db.user_lock.reader:
         return get_nearest_boundary(
             editable_element_info_boundaries,
-            element_info_cache[id(instance)][user.id]["elements_colored"],
+            instance.db.get_contribution_count("colored", user),
         )
 
 
@@ -332,7 +258,7 @@ async def icon_check(instance, user):
     async with instance.db.user_lock.reader:
         return boundary_list_check(
             editable_element_info_boundaries,
-            element_info_cache[id(instance)][user.id]["elements_iconed"],
+            instance.db.get_contribution_count("iconed", user),
         )
 
 
@@ -340,7 +266,7 @@ async def icon_progress(instance, user):
     async with instance.db.user_lock.reader:
         return get_nearest_boundary(
             editable_element_info_boundaries,
-            element_info_cache[id(instance)][user.id]["elements_iconed"],
+            instance.db.get_contribution_count("iconed", user),
         )
 
 
@@ -370,17 +296,17 @@ element_complexity_boundaries = [
 
 async def complexity_check(instance, user):
     async with instance.db.user_lock.reader, instance.db.element_lock.reader:
+        stats = await cache_element_stats(instance, user)
         return boundary_list_check(
-            element_complexity_boundaries,
-            element_stats_cache[id(instance)][user.id]["highest_complexity"],
+            element_complexity_boundaries, stats["highest_complexity"]
         )
 
 
 async def complexity_progress(instance, user):
     async with instance.db.user_lock.reader, instance.db.element_lock.reader:
+        stats = await cache_element_stats(instance, user)
         return get_nearest_boundary(
-            element_complexity_boundaries,
-            element_stats_cache[id(instance)][user.id]["highest_complexity"],
+            element_complexity_boundaries, stats["highest_complexity"]
         )
 
 
@@ -406,17 +332,17 @@ element_tree_size_boundaries = [
 
 async def tree_size_check(instance, user):
     async with instance.db.user_lock.reader, instance.db.element_lock.reader:
+        stats = await cache_element_stats(instance, user)
         return boundary_list_check(
-            element_tree_size_boundaries,
-            element_stats_cache[id(instance)][user.id]["highest_tree_size"],
+            element_tree_size_boundaries, stats["highest_tree_size"]
         )
 
 
 async def tree_size_progress(instance, user):
     async with instance.db.user_lock.reader, instance.db.element_lock.reader:
+        stats = await cache_element_stats(instance, user)
         return get_nearest_boundary(
-            element_tree_size_boundaries,
-            element_stats_cache[id(instance)][user.id]["highest_tree_size"],
+            element_tree_size_boundaries, stats["highest_tree_size"]
         )
 
 
@@ -444,17 +370,17 @@ element_difficulty_boundaries = [
 
 async def difficulty_check(instance, user):
     async with instance.db.user_lock.reader, instance.db.element_lock.reader:
+        stats = await cache_element_stats(instance, user)
         return boundary_list_check(
-            element_difficulty_boundaries,
-            element_stats_cache[id(instance)][user.id]["highest_difficulty"],
+            element_difficulty_boundaries, stats["highest_difficulty"]
         )
 
 
 async def difficulty_progress(instance, user):
     async with instance.db.user_lock.reader, instance.db.element_lock.reader:
+        stats = await cache_element_stats(instance, user)
         return get_nearest_boundary(
-            element_difficulty_boundaries,
-            element_stats_cache[id(instance)][user.id]["highest_difficulty"],
+            element_difficulty_boundaries, stats["highest_difficulty"]
         )
 
 
@@ -463,6 +389,9 @@ async def difficulty_progress(instance, user):
 # default: str = what is defaulted to if the req_func returns an index outside of the names list (roman numerals added based on how far off the returned index is)
 # req_func: Callable[[GameInstance, User], int] = the function that takes in user data and returns the appropriate tier of achievement
 # progress_func: Callable[[GameInstance, User], Tuple[int, int]] = function that takes in user data and returns the next goal and the current value
+# events: List[str] = what makes the achievement worth checking again, see Database.add_achievement_event
+#   "element": user got a new element, "combo": user's combo was added, "vote": user voted on an accepted poll
+#   "poll": user's poll was accepted, "achievement": user got another achievement
 
 achievements = {
     -1: {
@@ -470,6 +399,7 @@ achievements = {
         "default": "Achiever",
         "req_func": achievement_achievement_check,
         "progress_func": achievement_achievement_progress,
+        "events": ["achievement"],
         "items": "Achievement",
     },
     0: {
@@ -487,6 +417,7 @@ achievements = {
         "default": "Ultimate Elementalist",
         "req_func": elements_collected_check,
         "progress_func": elements_collected_progress,
+        "events": ["element"],
         "items": "Element",
     },
     1: {
@@ -513,6 +444,7 @@ achievements = {
         "default": "Mighty Creator",
         "req_func": elements_created_check,
         "progress_func": elements_created_progress,
+        "events": ["combo"],
         "items": "Created Combo",
     },
     2: {
@@ -527,6 +459,7 @@ achievements = {
         "default": "Judge",
         "req_func": votes_cast_check,
         "progress_func": votes_cast_progress,
+        "events": ["vote"],
         "items": "Vote",
     },
     3: {
@@ -538,6 +471,7 @@ achievements = {
         ],
         "req_func": leaderboard_pos_check,
         "progress_func": leaderboard_pos_progress,
+        "events": ["element"],
         "items": "Leaderboard Position",
         # No default as it is impossible for an outside index to be returned
         "default": None,
@@ -553,6 +487,7 @@ achievements = {
         ],
         "req_func": element_ids_in_a_row_check,
         "progress_func": element_ids_in_a_row_progress,
+        "events": ["element"],
         "items": "Elements in a row",
         "default": "Order Guardian",
     },
@@ -572,6 +507,7 @@ achievements = {
         ],
         "req_func": mark_check,
         "progress_func": mark_progress,
+        "events": ["poll"],
         "items": "Marked Element",
         "default": "Novelist",
     },
@@ -591,6 +527,7 @@ achievements = {
         ],
         "req_func": image_check,
         "progress_func": image_progress,
+        "events": ["poll"],
         "items": "Imaged Element",
         "default": "Photographer",
     },
@@ -610,6 +547,7 @@ achievements = {
         ],
         "req_func": color_check,
         "progress_func": color_progress,
+        "events": ["poll"],
         "items": "Colored Element",
         "default": "Artist",
     },
@@ -629,6 +567,7 @@ achievements = {
         ],
         "req_func": icon_check,
         "progress_func": icon_progress,
+        "events": ["poll"],
         "items": "Iconed Element",
         "default": "Symbolist",
     },
@@ -657,6 +596,7 @@ achievements = {
         ],
         "req_func": complexity_check,
         "progress_func": complexity_progress,
+        "events": ["element"],
         "items": "Tier",
         "default": "Platinum Tier Element",
     },
@@ -681,6 +621,7 @@ achievements = {
         ],
         "req_func": tree_size_check,
         "progress_func": tree_size_progress,
+        "events": ["element"],
         "items": "Tree Size",
         "default": "Transcended Element",
     },
@@ -707,6 +648,7 @@ achievements = {
         ],
         "req_func": difficulty_check,
         "progress_func": difficulty_progress,
+        "events": ["element"],
         "items": "Difficulty",
         "default": "Demon Element",
     },
@@ -1,13 +1,21 @@
 __all__ = ["GameInstance"]
 
 
+from pyeod import config
 from pyeod.errors import GameError, InternalError
 from pyeod.model.achievements import achievements, user_icons
 from pyeod.model.mixins import SavableMixin
 from pyeod.model.polls import ElementPoll
-from pyeod.model.types import Database, Element, Poll, User
+from pyeod.model.types import (
+    Database,
+    Element,
+    ElementCategory,
+    LRUCache,
+    Poll,
+    User,
+)
 from pyeod.utils import format_list, int_to_roman
-from typing import List, Tuple, Union, Optional
+from typing import List, Tuple, Union, Optional, Set
 import copy
 import random
 import asyncio
@@ -53,27 +61,31 @@ class GameInstance(SavableMixin):
                 inv = [elem.id for elem in self.db.starters]
                 self.db.users[user_id] = User(user_id, inv)
                 self.db.created_by_lookup[user_id] = []
+                for ranking in self.db.rankings.values():
+                    ranking.set(user_id, 0)
+                self.db.rankings["inv"].set(user_id, len(inv))
+                self.db.add_achievement_event(self.db.users[user_id], "element")
+                self.db.add_journal_entry("user", user_id)
             return self.db.users[user_id]
 
-    async def check_elements(
+    def check_elements_unsafe(
         self, element_name_list: Tuple[str, ...], user: Optional[User] = None
     ) -> Tuple[Element, ...]:
         elements = []
         unobtained = set()
         nonexistent = set()
-        async with self.db.element_lock.reader:
-            for i in element_name_list:
-                try:
-                    element = await self.get_element_by_str(user, i)
-                    if user is not None and element.id not in user.inv:
-                        unobtained.add(element)
-                    else:
-                        elements.append(element)
-                except GameError as e:
-                    if e.type == "Element does not exist":
-                        nonexistent.add(e.meta["element_name"])
-                    else:
-                        raise e
+        for i in element_name_list:
+            try:
+                element = self.get_element_by_str_unsafe(user, i)
+                if user is not None and element.id not in user.inv:
+                    unobtained.add(element)
+                else:
+                    elements.append(element)
+            except GameError as e:
+                if e.type == "Element does not exist":
+                    nonexistent.add(e.meta["element_name"])
+                else:
+                    raise e
 
         if unobtained:
             unobtained = sorted(list(unobtained), key=lambda elem: elem.id)
@@ -91,10 +103,37 @@ class GameInstance(SavableMixin):
             )
         return tuple(elements)
 
+    async def check_elements(
+        self, element_name_list: Tuple[str, ...], user: Optional[User] = None
+    ) -> Tuple[Element, ...]:
+        return await self.db.element_lock.read(
+            self.check_elements_unsafe, element_name_list, user
+        )
+
+    def get_combo_unsafe(
+        self, user: User, combo: Tuple[str, ...]
+    ) -> Tuple[Tuple[Element, ...], Optional[Element]]:
+        # Plain names always give the same elements, and a combo's result
+        # never changes once it exists, so repeats can skip the lookups
+        key = tuple(name.lower() for name in combo)
+        cacheable = all(name and not name.startswith("#") for name in key)
+        if cacheable and user.combo_cache is not None:
+            cached = user.combo_cache.get(key)
+            if cached is not None:
+                return cached
+        element_combo = self.check_elements_unsafe(combo, user)
+        result = self.db.get_combo_result_unsafe(element_combo)
+        if cacheable and result is not None:
+            if user.combo_cache is None:
+                user.combo_cache = LRUCache(config.COMBO_CACHE_SIZE)
+            user.combo_cache.set(key, (element_combo, result))
+        return element_combo, result
+
     async def combine(self, user: User, combo: Tuple[str, ...]) -> Element:
-        element_combo = await self.check_elements(combo, user)
+        element_combo, result = await self.db.element_lock.read(
+            self.get_combo_unsafe, user, combo
+        )
         user.last_combo = tuple(sorted(element_combo))
-        result = await self.db.get_combo_result(element_combo)
         if result is None:
             user.last_element = None
             raise GameError(
@@ -112,6 +151,7 @@ class GameInstance(SavableMixin):
                 raise GameError("Too many active polls")
             self.db.polls.append(poll)
             poll.author.active_polls += 1
+            self.db.mark_changed()
             return poll
 
     async def suggest_element(
@@ -151,6 +191,8 @@ class GameInstance(SavableMixin):
                 else:
                     new_polls.append(poll)
             self.db.polls = new_polls
+            if deleted_polls:
+                self.db.mark_changed()
             return deleted_polls
 
     async def check_single_poll(self, poll: Poll) -> bool:
@@ -158,38 +200,53 @@ class GameInstance(SavableMixin):
             async with self.db.poll_lock.writer:
                 poll.author.active_polls -= 1
                 self.db.polls.remove(poll)
+                self.db.mark_changed()
             if poll.votes >= self.vote_req:
                 # Poll was accepted
                 poll.accepted = True
                 await poll.resolve(self.db)
-                self.db.check_achievements_list.add(poll.author)
+                self.db.add_achievement_event(poll.author, "poll")
             else:
                 self.polls_rejected += 1
             return True
         return False
 
-    async def get_achievements(self, user: User) -> List[List[int]]:
+    async def get_achievements(
+        self, user: User, events: Optional[Set[str]] = None
+    ) -> List[List[int]]:
+        """
+        Award any achievements the user now meets. Only achievements
+        depending on one of the given events are checked, or all of
+        them if no events are given.
+
+        """
         user_achievements: List[List[int]] = user.achievements
         new_achievements: List[List[int]] = []
+        unlocked = {tuple(achievement) for achievement in user_achievements}
+        if events is not None:
+            events = set(events)
         achievement_ids = list(achievements)
-        await achievements[-1]["req_func"](self, user)  # Run check func to cache things
         achievement_ids.append(achievement_ids.pop(0))  # move first achievement to end
         for achievement_id in achievement_ids:
             achievement_data = achievements[achievement_id]
+            if events is not None and events.isdisjoint(achievement_data["events"]):
+                continue
             returned_tier = await achievement_data["req_func"](self, user)
             if returned_tier is None:
                 continue
             returned_tier = int(returned_tier)
-            if [achievement_id, returned_tier] not in user_achievements:
-                user_achievements.append([achievement_id, returned_tier])
-                new_achievements.append([achievement_id, returned_tier])
-            # Check previous achievements if skipped over
-            if [achievement_id, returned_tier - 1] not in user_achievements:
-                for i in range(returned_tier):
-                    if [achievement_id, i] not in user_achievements:
-                        user_achievements.append([achievement_id, i])
-                        new_achievements.append([achievement_id, i])
-
+            # Check previous achievements too if skipped over
+            for i in [returned_tier] + list(range(returned_tier)):
+                if (achievement_id, i) not in unlocked:
+                    unlocked.add((achievement_id, i))
+                    user_achievements.append([achievement_id, i])
+                    new_achievements.append([achievement_id, i])
+            if new_achievements and events is not None:
+                events.add("achievement")
+
+        if new_achievements:
+            self.db.rankings["achievements"].set(user.id, len(user_achievements))
+            self.db.mark_changed()
         return new_achievements
 
     async def get_achievement_name(self, achievement: Union[List[int], None]) -> str:
@@ -246,15 +303,28 @@ class GameInstance(SavableMixin):
             or user_icons[icon]["req"] in user.achievements
         ):
             user.icon = icon
+            self.db.mark_changed()
         else:
             raise GameError(
                 "Cannot use icon",
                 "You do not have the achievement required to use that icon!",
             )
 
-    async def get_element_by_str(self, user: User, string: str) -> Element:
-        async with self.db.element_lock.reader:
-            if not string:
+    def get_element_by_str_unsafe(self, user: User, string: str) -> Element:
+        if not string:
+            if user.last_element is not None:
+                return user.last_element
+            else:
+                raise GameError(
+                    "No previous element",
+                    "Combine something first!",
+                    {"element_name": string, "user": user},
+                )
+        if string.startswith("#"):
+            elem_id = string[1:].strip()
+            if elem_id.isdecimal() and int(elem_id) in self.db.elem_id_lookup:
+                return self.db.elem_id_lookup[int(elem_id)]
+            elif elem_id in ["l", "last"] and user is not None:
                 if user.last_element is not None:
                     return user.last_element
                 else:
@@ -263,37 +333,29 @@ class GameInstance(SavableMixin):
                         "Combine something first!",
                         {"element_name": string, "user": user},
                     )
-            if string.startswith("#"):
-                elem_id = string[1:].strip()
-                if elem_id.isdecimal() and int(elem_id) in self.db.elem_id_lookup:
-                    return self.db.elem_id_lookup[int(elem_id)]
-                elif elem_id in ["l", "last"] and user is not None:
-                    if user.last_element is not None:
-                        return user.last_element
-                    else:
-                        raise GameError(
-                            "No previous element",
-                            "Combine something first!",
-                            {"element_name": string, "user": user},
-                        )
-                elif elem_id in ["r", "random"]:
-                    return random.choice(list(self.db.elements.values()))
-                elif elem_id in ["ri", "randomininv"]:
-                    return self.db.elem_id_lookup[random.choice(user.inv)]
-                else:
-                    raise GameError(
-                        "Element id does not exist",
-                        f"Element with ID **#{elem_id}** doesn't exist!",
-                        {"element_name": string, "user": user},
-                    )
-            if string.lower() in self.db.elements:
-                return self.db.elements[string.lower()]
+            elif elem_id in ["r", "random"]:
+                return random.choice(list(self.db.elements.values()))
+            elif elem_id in ["ri", "randomininv"]:
+                return self.db.elem_id_lookup[random.choice(user.inv)]
             else:
                 raise GameError(
-                    "Element does not exist",
-                    f"Element **{string}** doesn't exist!",
+                    "Element id does not exist",
+                    f"Element with ID **#{elem_id}** doesn't exist!",
                     {"element_name": string, "user": user},
                 )
+        if string.lower() in self.db.elements:
+            return self.db.elements[string.lower()]
+        else:
+            raise GameError(
+                "Element does not exist",
+                f"Element **{string}** doesn't exist!",
+                {"element_name": string, "user": user},
+            )
+
+    async def get_element_by_str(self, user: User, string: str) -> Element:
+        return await self.db.element_lock.read(
+            self.get_element_by_str_unsafe, user, string
+        )
 
     def convert_to_dict(self, data: dict) -> None:
         data["db"] = self.db
@@ -313,6 +375,109 @@ class GameInstance(SavableMixin):
         )
 
 
+def generate_database(
+    elements: int = 1_000,
+    users: int = 100,
+    combos_per_element: int = 3,
+    combo_size: int = 2,
+    categories: int = 10,
+    polls: int = 20,
+    seed: int = 0,
+    inventory_shape: float = 1.2,
+    inventory_scale: float = 20,
+) -> Database:
+    """
+    Build a random database that is the same for the same arguments.
+    Every element is made from lower IDs, mostly ones close to it, and
+    most users only get through the first few elements. How far users
+    get follows a Pareto distribution with ``inventory_shape`` as alpha,
+    scaled by ``inventory_scale``; a lower shape gives a longer tail.
+
+    """
+    rng = random.Random(seed)
+    starters = tuple(
+        Element(elem.name, id=elem.id, color=elem.color)
+        for elem in DEFAULT_STARTER_ELEMENTS
+    )
+    user_list = [
+        User(
+            user_id,
+            [elem.id for elem in starters],
+            created_combo_count=rng.randint(0, 50),
+            votes_cast_count=rng.randint(0, 100),
+        )
+        for user_id in range(1, users + 1)
+    ]
+
+    element_list = list(starters)
+    combos = {}
+    for elem_id in range(len(starters) + 1, elements + 1):
+        element = Element(
+            f"Element {elem_id}",
+            rng.choice(user_list),
+            1_700_000_000 + elem_id * 60,
+            elem_id,
+            color=rng.randint(0, 0xFFFFFF),
+        )
+        if rng.random() < 0.05:
+            element.mark = f"Mark {elem_id}"
+            element.marker = rng.choice(user_list)
+        if rng.random() < 0.05:
+            element.image = f"https://example.com/{elem_id}.png"
+            element.imager = rng.choice(user_list)
+        if rng.random() < 0.05:
+            element.colorer = rng.choice(user_list)
+        if rng.random() < 0.02:
+            element.icon = f"https://example.com/{elem_id}_icon.png"
+            element.iconer = rng.choice(user_list)
+        element_list.append(element)
+        made = 0
+        wanted = rng.randint(1, combos_per_element)
+        # Elements without a combo would be dropped on load, so retry those
+        for attempt in range(100):
+            if made == wanted or (made and attempt >= wanted):
+                break
+            combo = []
+            for _ in range(combo_size):
+                if rng.random() < 0.5:
+                    combo.append(rng.randint(max(1, elem_id - 50), elem_id - 1))
+                else:
+                    combo.append(rng.randint(1, elem_id - 1))
+            combo = tuple(sorted(combo))
+            if combo not in combos:
+                combos[combo] = element
+                made += 1
+
+    for user in user_list:
+        # Long tail, about 100 elements on average with the defaults
+        reached = int(rng.paretovariate(inventory_shape) * inventory_scale)
+        last_id = min(elements, len(starters) + reached)
+        for elem_id in range(len(starters) + 1, last_id + 1):
+            if rng.random() < 0.9:
+                user.inv.append(elem_id)
+
+    category_dict = {}
+    for i in range(categories):
+        members = rng.sample(element_list, min(50, len(element_list)))
+        category_dict[f"category {i}"] = ElementCategory(f"Category {i}", members)
+
+    poll_list = []
+    for i in range(polls):
+        author = rng.choice(user_list)
+        combo = tuple(rng.sample(element_list, combo_size))
+        poll_list.append(ElementPoll(author, combo, f"Suggestion {i}", False))
+        author.active_polls += 1
+
+    return Database(
+        {elem.name.lower(): elem for elem in element_list},
+        starters,
+        combos,
+        {user.id: user for user in user_list},
+        poll_list,
+        category_dict,
+    )
+
+
 async def generate_test_game():
     game = GameInstance()
     user = await game.login_user(0)
@@ -321,11 +486,8 @@ async def generate_test_game():
         await game.combine(user, combo)
     except GameError as g:
         if g.type == "Not a combo":
-            await game.suggest_element(
-                user,
-                tuple([await game.check_element(name) for name in combo]),
-                "Inferno",
-            )
+            elements = await game.check_elements(combo)
+            await game.suggest_element(user, elements, "Inferno")
     game.db.polls[0].votes += 4
     await game.check_polls()
     return game
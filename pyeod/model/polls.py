@@ -47,12 +47,10 @@ class ElementPoll(Poll):
                         raise InternalError(
                             "Override ID in use", "Cannot use overridden ID"
                         )
-                    if self.id_override > database.max_id:
-                        database.max_id = self.id_override
                     selected_id = self.id_override
                 else:
-                    database.max_id += 1
-                    selected_id = database.max_id
+                    # add_element_unsafe raises max_id once the element exists
+                    selected_id = database.max_id + 1
                 color = Element.get_color(self.combo)
                 element = Element(
                     self.result,
@@ -73,6 +71,10 @@ class ElementPoll(Poll):
                 self.author.last_combo = ()
                 self.author.last_element = element
             self.author.created_combo_count += 1
+            database.rankings["combos"].set(
+                self.author.id, self.author.created_combo_count
+            )
+            database.add_achievement_event(self.author, "combo")
             if not self.exists:
                 database.category_lookup[element.id] = set()
         return element
@@ -167,8 +169,13 @@ class MarkPoll(Poll):
 
     async def resolve(self, database: Database) -> str:
         async with database.element_lock.writer:
+            database.preserve(self.marked_element)
             self.marked_element.mark = self.mark
+            database.move_contribution(
+                "marked", self.marked_element, self.marked_element.marker, self.author
+            )
             self.marked_element.marker = self.author
+            database.add_journal_entry("element", self.marked_element)
             return self.mark
 
     async def get_news_message(self, instance: "GameInstance") -> str:
@@ -236,8 +243,16 @@ class ColorPoll(Poll):
 
     async def resolve(self, database: Database) -> int:
         async with database.element_lock.writer:
+            database.preserve(self.colored_element)
             self.colored_element.color = self.color
+            database.move_contribution(
+                "colored",
+                self.colored_element,
+                self.colored_element.colorer,
+                self.author,
+            )
             self.colored_element.colorer = self.author
+            database.add_journal_entry("element", self.colored_element)
             return self.color
 
     async def get_news_message(self, instance: "GameInstance") -> str:
@@ -314,8 +329,13 @@ class ImagePoll(Poll):
 
     async def resolve(self, database: Database) -> str:
         async with database.element_lock.writer:
+            database.preserve(self.imaged_element)
             self.imaged_element.image = self.image
+            database.move_contribution(
+                "imaged", self.imaged_element, self.imaged_element.imager, self.author
+            )
             self.imaged_element.imager = self.author
+            database.add_journal_entry("element", self.imaged_element)
             return self.image
 
     async def get_news_message(self, instance: "GameInstance") -> str:
@@ -386,8 +406,13 @@ class IconPoll(Poll):
 
     async def resolve(self, database: Database) -> str:
         async with database.element_lock.writer:
+            database.preserve(self.iconed_element)
             self.iconed_element.icon = self.icon
+            database.move_contribution(
+                "iconed", self.iconed_element, self.iconed_element.iconer, self.author
+            )
             self.iconed_element.iconer = self.author
+            database.add_journal_entry("element", self.iconed_element)
             return self.icon
 
     async def get_news_message(self, instance: "GameInstance") -> str:
@@ -456,7 +481,9 @@ class AddCollabPoll(Poll):
 
     async def resolve(self, database: Database) -> Tuple[User, ...]:
         async with database.element_lock.writer:
+            database.preserve(self.element)
             self.element.extra_authors += self.extra_authors
+            database.add_journal_entry("element", self.element)
             return self.extra_authors
 
     async def get_news_message(self, instance: "GameInstance") -> str:
@@ -521,8 +548,10 @@ class RemoveCollabPoll(Poll):
 
     async def resolve(self, database: Database) -> Tuple[User, ...]:
         async with database.element_lock.writer:
+            database.preserve(self.element)
             for i in self.extra_authors:
                 self.element.extra_authors.remove(i)
+            database.add_journal_entry("element", self.element)
             return self.extra_authors
 
     async def get_news_message(self, instance: "GameInstance") -> str:
@@ -591,16 +620,19 @@ class AddCategoryPoll(Poll):
             if self.category.lower() not in database.categories:
                 category = ElementCategory(self.category, self.elements)
                 database.categories[self.category.lower()] = category
+                database.category_index.add(self.category.lower())
                 for element in self.elements:
                     database.category_lookup[element.id].add(category.name)
             else:
                 category = database.categories[self.category.lower()]
                 if not isinstance(category, ElementCategory):
                     return
+                database.preserve(category)
                 for element in self.elements:
                     if element not in category.elements:
                         category.elements.append(element)
                         database.category_lookup[element.id].add(category.name)
+            database.add_journal_entry("category", category)
 
     async def get_news_message(self, instance: "GameInstance") -> str:
         msg = ""
@@ -676,6 +708,7 @@ class RemoveCategoryPoll(Poll):
             category = database.categories[self.category.lower()]
             if not isinstance(category, ElementCategory):
                 return
+            database.preserve(category)
             for element in self.elements:
                 if element in category.elements:
                     category.elements.remove(element)
@@ -684,6 +717,10 @@ class RemoveCategoryPoll(Poll):
             if not category.elements:
                 self.deleted = True
                 database.categories.pop(self.category.lower())
+                database.category_index.remove(self.category.lower())
+                database.add_journal_entry("remove_category", self.category)
+            else:
+                database.add_journal_entry("category", category)
 
     async def get_news_message(self, instance: "GameInstance") -> str:
         msg = ""
@@ -1,22 +1,53 @@
 __all__ = [
     "Element",
+    "Inventory",
+    "SearchIndex",
+    "Ranking",
+    "LRUCache",
+    "InstrumentedRWLock",
     "User",
     "Poll",
     "Database",
+    "DatabaseSnapshot",
     "Category",
     "ElementCategory",
 ]
 
 
+from pyeod import config
 from pyeod.errors import GameError, InternalError
 from pyeod.model.mixins import SavableMixin
 from aiorwlock import RWLock
 from abc import abstractmethod
-from typing import Dict, List, Tuple, Union, Optional
+from collections import OrderedDict, deque
+from typing import Any, Dict, Iterable, Iterator, List, Set, Tuple, Union, Optional
+import os
+import sys
+import copy
 import time
+import asyncio
+import heapq
+import bisect
 import colorsys
 
 
+def get_combo_key(ids: List[int]) -> Tuple[int, ...]:
+    # Combos are keyed by sorted IDs, most have two or three elements
+    if len(ids) == 2:
+        a, b = ids
+        return (a, b) if a <= b else (b, a)
+    if len(ids) == 3:
+        a, b, c = ids
+        if a > b:
+            a, b = b, a
+        if b > c:
+            b, c = c, b
+        if a > b:
+            a, b = b, a
+        return (a, b, c)
+    return tuple(sorted(ids))
+
+
 class Element(SavableMixin):
     __slots__ = (
         "name",
@@ -137,6 +168,373 @@ class Element(SavableMixin):
         return element
 
 
+class Inventory(list):
+    """
+    Element IDs in the order they were found, with a set
+    alongside for constant time membership checks.
+    Also tracks how many element IDs in a row are owned and which
+    elements can be hinted, see ``Database.get_ids_in_a_row`` and
+    ``Database.get_hint_choices``. Saved as a plain list.
+
+    """
+
+    __slots__ = ("lookup", "row_next", "row_length", "hint_pos", "hint_choices")
+
+    def __init__(self, elements: Iterable[int] = ()) -> None:
+        super().__init__(elements)
+        self.lookup = set(self)
+        self.reset_row()
+        self.reset_hints()
+
+    def reset_row(self) -> None:
+        # Lowest ID not yet known to be owned, and owned elements below it
+        self.row_next = 1
+        self.row_length = 0
+
+    def reset_hints(self) -> None:
+        # Elements before hint_pos have been checked for hint choices
+        self.hint_pos = 0
+        self.hint_choices: Set[int] = set()
+
+    def __contains__(self, elem_id: object) -> bool:
+        return elem_id in self.lookup
+
+    def append(self, elem_id: int) -> None:
+        super().append(elem_id)
+        self.lookup.add(elem_id)
+
+    def extend(self, elem_ids: Iterable[int]) -> None:
+        for elem_id in elem_ids:
+            self.append(elem_id)
+
+    def __iadd__(self, elem_ids: Iterable[int]) -> "Inventory":
+        self.extend(elem_ids)
+        return self
+
+    def insert(self, index: int, elem_id: int) -> None:
+        super().insert(index, elem_id)
+        self.lookup.add(elem_id)
+        # Elements after it move past hint_pos
+        self.reset_hints()
+
+    def pop(self, index: int = -1) -> int:
+        elem_id = super().pop(index)
+        self.lookup.discard(elem_id)
+        if elem_id < self.row_next:
+            self.reset_row()
+        self.reset_hints()
+        return elem_id
+
+    def reset(self) -> None:
+        # After arbitrary changes, rare enough to start over
+        self.lookup = set(self)
+        self.reset_row()
+        self.reset_hints()
+
+    def remove(self, elem_id: int) -> None:
+        super().remove(elem_id)
+        self.reset()
+
+    def clear(self) -> None:
+        super().clear()
+        self.reset()
+
+    def __setitem__(self, index, value) -> None:
+        super().__setitem__(index, value)
+        self.reset()
+
+    def __delitem__(self, index) -> None:
+        super().__delitem__(index)
+        self.reset()
+
+    def __imul__(self, count: int) -> "Inventory":
+        super().__imul__(count)
+        self.reset()
+        return self
+
+    def sort(self, *args, **kwargs) -> None:
+        super().sort(*args, **kwargs)
+        self.reset_hints()
+
+    def reverse(self) -> None:
+        super().reverse()
+        self.reset_hints()
+
+
+class SearchIndex:
+    """
+    Finds lowercase names starting with or containing some text
+    without going through all of them. Names are kept sorted for
+    prefix searches, and each three letter piece of a name lists
+    the names containing it for substring searches.
+
+    """
+
+    def __init__(self, names: Iterable[str] = ()) -> None:
+        self.names = sorted(set(names))
+        self.trigrams: Dict[str, List[str]] = {}
+        for name in self.names:
+            for trigram in SearchIndex.get_trigrams(name):
+                self.trigrams.setdefault(trigram, []).append(name)
+
+    @staticmethod
+    def get_trigrams(name: str) -> Set[str]:
+        return {name[i : i + 3] for i in range(len(name) - 2)}
+
+    def add(self, name: str) -> None:
+        index = bisect.bisect_left(self.names, name)
+        if index < len(self.names) and self.names[index] == name:
+            return
+        self.names.insert(index, name)
+        for trigram in SearchIndex.get_trigrams(name):
+            self.trigrams.setdefault(trigram, []).append(name)
+
+    def remove(self, name: str) -> None:
+        index = bisect.bisect_left(self.names, name)
+        if index == len(self.names) or self.names[index] != name:
+            return
+        del self.names[index]
+        for trigram in SearchIndex.get_trigrams(name):
+            self.trigrams[trigram].remove(name)
+            if not self.trigrams[trigram]:
+                del self.trigrams[trigram]
+
+    def search(self, text: str, limit: int = 25) -> List[str]:
+        """
+        Get up to ``limit`` names containing ``text``, names
+        starting with it first, then by where ``text`` appears.
+
+        """
+        text = text.lower()
+        results = []
+        index = bisect.bisect_left(self.names, text)
+        while index < len(self.names) and len(results) < limit:
+            if not self.names[index].startswith(text):
+                break
+            results.append(self.names[index])
+            index += 1
+        if len(results) == limit:
+            return results
+
+        if len(text) < 3:
+            # Short text is in most names, so stop at the first few
+            for name in self.names:
+                if text in name and not name.startswith(text):
+                    results.append(name)
+                    if len(results) == limit:
+                        break
+            return results
+
+        # Every match is in the list of each trigram, check the shortest one
+        candidates = min(
+            (self.trigrams.get(trigram, []) for trigram in self.get_trigrams(text)),
+            key=len,
+        )
+        matches = [
+            name for name in candidates if text in name and not name.startswith(text)
+        ]
+        results.extend(
+            heapq.nsmallest(
+                limit - len(results),
+                matches,
+                key=lambda name: (name.index(text), len(name), name),
+            )
+        )
+        return results
+
+
+class Ranking:
+    """
+    User IDs ordered by some value, highest first. Kept in order
+    as values change so ranks are a binary search away.
+
+    """
+
+    def __init__(self, values: Optional[Dict[int, int]] = None) -> None:
+        self.values: Dict[int, int] = {} if values is None else values
+        # Values are negated so the highest comes first
+        self.order = sorted((-value, user_id) for user_id, value in self.values.items())
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        for value, user_id in self.order:
+            yield user_id, -value
+
+    def set(self, user_id: int, value: int) -> None:
+        old_value = self.values.get(user_id)
+        if old_value == value:
+            return
+        if old_value is not None:
+            del self.order[bisect.bisect_left(self.order, (-old_value, user_id))]
+        self.values[user_id] = value
+        bisect.insort(self.order, (-value, user_id))
+
+    def add(self, user_id: int, amount: int = 1) -> None:
+        self.set(user_id, self.values.get(user_id, 0) + amount)
+
+    def get_rank(self, user_id: int) -> int:
+        # Starts at 1
+        return bisect.bisect_left(self.order, (-self.values[user_id], user_id)) + 1
+
+    def get_range(self, start: int, stop: int) -> List[Tuple[int, int]]:
+        # (user ID, value) from rank start + 1 up to rank stop
+        return [(user_id, -value) for value, user_id in self.order[start:stop]]
+
+
+class LRUCache:
+    """
+    Holds up to ``maxsize`` values, dropping the least recently used.
+    Hits and misses are counted for monitoring.
+
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.items: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        if key not in self.items:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def set(self, key: Any, value: Any) -> None:
+        self.items[key] = value
+        self.items.move_to_end(key)
+        if len(self.items) > self.maxsize:
+            self.items.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Any) -> None:
+        self.items.pop(key, None)
+
+    def clear(self) -> None:
+        self.items.clear()
+
+
+# Frames skipped when looking for who acquired a lock
+LOCK_FRAMES = {"acquire", "__aenter__", "acquire_all_locks"}
+
+
+def get_call_site() -> str:
+    frame = sys._getframe(1)
+    while frame.f_code.co_filename == __file__ and frame.f_code.co_name in LOCK_FRAMES:
+        frame = frame.f_back
+    filename = os.path.basename(frame.f_code.co_filename)
+    return f"{frame.f_code.co_name} ({filename}:{frame.f_lineno})"
+
+
+class InstrumentedLockSide:
+    """
+    The reader or writer side of an :class:`InstrumentedRWLock`, used
+    the same way as the aiorwlock one.
+
+    """
+
+    def __init__(self, lock: "InstrumentedRWLock", side: Any, mode: str) -> None:
+        self.lock = lock
+        self.side = side
+        self.mode = mode
+        self.acquisitions = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+        # Stacks of (acquired time, call site, wait) by the holding task
+        self.holders: Dict[Any, List[Tuple[float, str, float]]] = {}
+
+    @property
+    def locked(self) -> bool:
+        return self.side.locked
+
+    async def acquire(self) -> None:
+        site = get_call_site()
+        tic = time.perf_counter()
+        await self.side.acquire()
+        acquired = time.perf_counter()
+        wait = acquired - tic
+        self.acquisitions += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        task = asyncio.current_task()
+        self.holders.setdefault(task, []).append((acquired, site, wait))
+
+    def release(self) -> None:
+        self.side.release()
+        task = asyncio.current_task()
+        if task not in self.holders:
+            # Released by a different task than the one that acquired it
+            task = next(iter(self.holders))
+        stack = self.holders[task]
+        acquired, site, wait = stack.pop()
+        if not stack:
+            del self.holders[task]
+        hold = time.perf_counter() - acquired
+        self.hold_total += hold
+        self.hold_max = max(self.hold_max, hold)
+        if hold >= config.LOCK_SLOW_SECONDS:
+            self.lock.slow_log.append((time.time(), self.mode, site, wait, hold))
+
+    def get_holders(self) -> List[Tuple[str, float]]:
+        now = time.perf_counter()
+        return [
+            (site, now - acquired)
+            for stack in self.holders.values()
+            for acquired, site, _ in stack
+        ]
+
+    async def __aenter__(self) -> None:
+        await self.acquire()
+
+    async def __aexit__(self, *args) -> None:
+        self.release()
+
+
+class InstrumentedRWLock:
+    """
+    An aiorwlock ``RWLock`` that records wait and hold times of each
+    side and where it is held from. Holds longer than
+    ``config.LOCK_SLOW_SECONDS`` are kept in ``slow_log`` as
+    (time, mode, call site, wait, hold) tuples.
+
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        lock = RWLock()
+        self.reader = InstrumentedLockSide(self, lock.reader, "reader")
+        self.writer = InstrumentedLockSide(self, lock.writer, "writer")
+        self.slow_log = deque(maxlen=config.LOCK_SLOW_LOG_SIZE)
+        self.optimistic_reads = 0
+
+    async def read(self, func, *args) -> Any:
+        """
+        Call ``func`` with ``args`` as a reader. Unless a writer is
+        partway through a change, the reader lock is not taken, so the
+        read doesn't queue behind saves or waiting writers.
+
+        ``func`` must not await or return an awaitable. The event loop
+        cannot switch tasks while it runs, so no writer can start
+        before it returns.
+
+        """
+        if not self.writer.locked:
+            self.optimistic_reads += 1
+            return func(*args)
+        async with self.reader:
+            return func(*args)
+
+
 class User(SavableMixin):
     __slots__ = (
         "id",
@@ -148,6 +546,7 @@ class User(SavableMixin):
         "icon",
         "last_combo",
         "last_element",
+        "combo_cache",
     )
 
     def __init__(
@@ -157,18 +556,20 @@ class User(SavableMixin):
         active_polls: int = 0,
         created_combo_count: int = 0,
         votes_cast_count: int = 0,
-        achievements: List[List[int]] = [],
+        achievements: Optional[List[List[int]]] = None,
         icon: int = 0,
     ) -> None:
         self.id = id
-        self.inv = inv
+        self.inv = Inventory(inv)
         self.active_polls = active_polls
         self.created_combo_count = created_combo_count
         self.votes_cast_count = votes_cast_count
-        self.achievements = achievements
+        self.achievements = [] if achievements is None else achievements
         self.icon = icon
         self.last_combo = ()
         self.last_element = None
+        # Element names to the elements and result, see GameInstance.combine
+        self.combo_cache: Optional[LRUCache] = None
 
     def add_element(self, element: Element):
         # Error handled outside
@@ -313,11 +714,12 @@ class Database(SavableMixin):
         self.polls = polls
         self.categories = categories
 
-        self.complexity_lock = RWLock()
-        self.element_lock = RWLock()  # covers both elements and combos
-        self.category_lock = RWLock()
-        self.user_lock = RWLock()
-        self.poll_lock = RWLock()
+        self.complexity_lock = InstrumentedRWLock("complexity")
+        # Covers both elements and combos
+        self.element_lock = InstrumentedRWLock("element")
+        self.category_lock = InstrumentedRWLock("category")
+        self.user_lock = InstrumentedRWLock("user")
+        self.poll_lock = InstrumentedRWLock("poll")
 
         notfound = []
         self.elem_id_lookup = {elem.id: elem for elem in self.elements.values()}
@@ -366,10 +768,122 @@ class Database(SavableMixin):
 
         self.complexities = {}
         self.min_elem_tree = {}
-        self.path_lookup = {}
+        self.tree_sizes: Dict[int, int] = {}
         self.category_lookup = {}
-        
-        self.check_achievements_list = set()
+        # Used by autocomplete
+        self.element_index = SearchIndex(self.elements)
+        self.category_index = SearchIndex(self.categories)
+        self.rankings: Dict[str, Ranking] = {}
+        # Contribution kind to user ID to IDs of elements they hold it for
+        self.contributions: Dict[str, Dict[int, Set[int]]] = {}
+        self.build_rankings()
+
+        # Highest complexity, tree size and difficulty in each user's inventory
+        self.element_stats_cache = LRUCache(config.ELEMENT_STATS_CACHE_SIZE)
+        # Users with achievements to check, and what happened since the last check
+        self.achievement_events: Dict[User, Set[str]] = {}
+        # Mutations not yet written to the journal, see pyeod.packer
+        self.journal: List[tuple] = []
+        self.journal_user_stats: Dict[int, tuple] = {}
+        # Bumped on every change so unchanged instances are not saved
+        self.generation = 0
+        self.journal_generation = 0
+        self.snapshot_generation = 0
+        # Frozen views still being read, see freeze
+        self.snapshots: List["DatabaseSnapshot"] = []
+
+    def build_rankings(self) -> None:
+        """
+        Rank users for each leaderboard. Rankings are kept up to date
+        where the values change, this only needs calling after loading.
+
+        """
+        values = {
+            "inv": {},
+            "suggested": {},
+            "combos": {},
+            "votes": {},
+            "achievements": {},
+            "marked": {},
+            "imaged": {},
+            "colored": {},
+            "iconed": {},
+        }
+        contributions = {
+            "marked": {},
+            "imaged": {},
+            "colored": {},
+            "iconed": {},
+        }
+        for user in self.users.values():
+            values["inv"][user.id] = len(user.inv)
+            values["suggested"][user.id] = len(self.created_by_lookup[user.id])
+            values["combos"][user.id] = user.created_combo_count
+            values["votes"][user.id] = user.votes_cast_count
+            values["achievements"][user.id] = len(user.achievements)
+            for name in contributions:
+                contributions[name][user.id] = set()
+        for elem in self.elements.values():
+            if elem.marker is not None:
+                contributions["marked"][elem.marker.id].add(elem.id)
+            if elem.imager is not None:
+                contributions["imaged"][elem.imager.id].add(elem.id)
+            if elem.colorer is not None:
+                contributions["colored"][elem.colorer.id].add(elem.id)
+            if elem.iconer is not None:
+                contributions["iconed"][elem.iconer.id].add(elem.id)
+        for name, lookup in contributions.items():
+            for user_id, elements in lookup.items():
+                values[name][user_id] = len(elements)
+        self.rankings = {name: Ranking(values[name]) for name in values}
+        self.contributions = contributions
+
+    def move_contribution(
+        self,
+        ranking: str,
+        element: Element,
+        old_user: Optional[User],
+        new_user: User,
+    ) -> None:
+        # An element's mark, image, color or icon changed hands
+        lookup = self.contributions[ranking]
+        if old_user is not None:
+            lookup[old_user.id].discard(element.id)
+            self.rankings[ranking].set(old_user.id, len(lookup[old_user.id]))
+        lookup.setdefault(new_user.id, set()).add(element.id)
+        self.rankings[ranking].set(new_user.id, len(lookup[new_user.id]))
+
+    def get_contribution_count(self, ranking: str, user: User) -> int:
+        return len(self.contributions[ranking].get(user.id, ()))
+
+    def add_achievement_event(self, user: User, event: str) -> None:
+        # See the "events" of each achievement in pyeod.model.achievements
+        self.achievement_events.setdefault(user, set()).add(event)
+
+    def freeze(self) -> "DatabaseSnapshot":
+        """
+        Take a frozen view of the database, cheap enough to do on the
+        event loop. Until it is released, elements and categories are
+        copied before changing, see preserve.
+
+        """
+        snapshot = DatabaseSnapshot(self)
+        self.snapshots = self.snapshots + [snapshot]
+        return snapshot
+
+    def preserve(self, item: Union[Element, Category]) -> None:
+        # Call before changing an element or category in place
+        for snapshot in self.snapshots:
+            snapshot.preserve(item)
+
+    def add_journal_entry(self, *entry) -> None:
+        self.journal.append(entry)
+        self.mark_changed()
+
+    def mark_changed(self) -> None:
+        # For changes saved with the instance state rather than journaled,
+        # like settings, polls and counters
+        self.generation += 1
 
     async def acquire_all_locks(self):
         await self.complexity_lock.reader.acquire()
@@ -377,6 +891,15 @@ class Database(SavableMixin):
         await self.user_lock.reader.acquire()
         await self.poll_lock.reader.acquire()
 
+    def get_locks(self) -> List[InstrumentedRWLock]:
+        return [
+            self.complexity_lock,
+            self.element_lock,
+            self.category_lock,
+            self.user_lock,
+            self.poll_lock,
+        ]
+
     def release_all_locks(self):
         self.complexity_lock.reader.release()
         self.element_lock.reader.release()
@@ -387,53 +910,49 @@ class Database(SavableMixin):
         for elem in self.starters:
             self.complexities[elem.id] = 0
             self.min_elem_tree[elem.id] = ()
-        self.path_lookup = {elem.id: {elem.id} for elem in self.starters}
+        self.tree_sizes = {elem.id: 1 for elem in self.starters}
         self.category_lookup = {elem.id: set() for elem in self.starters}
 
     async def calculate_infos(self) -> None:
         async with self.complexity_lock.writer:
             async with self.element_lock.reader:
-                for elem in self.starters:
-                    self.complexities[elem.id] = 0
-                    self.min_elem_tree[elem.id] = ()
-
-                unseen = set(self.elem_id_lookup)
-                for elem in self.starters:
-                    unseen.remove(elem.id)
-                while len(unseen) != 0:
-                    for elem_id in unseen:
-                        complexity = self.get_complexity(elem_id)
-                        if complexity is not None:
-                            unseen.remove(elem_id)
-                            break
-                    else:
-                        print("Warning: Dropping elements:", unseen)
-                        self.element_lock.reader.release()
-                        async with self.element_lock.writer:
-                            for elem_id in unseen:
-                                assert elem_id not in self.complexities
-                                element = self.elem_id_lookup[elem_id]
-                                self.elements.pop(element.name.lower())
-                                self.combo_lookup.pop(elem_id)
-                                self.used_in_lookup.pop(elem_id)
-                                self.elem_id_lookup.pop(elem_id)
-                                self.found_by_lookup.pop(elem_id)
-                        await self.element_lock.reader.acquire()
-                        break
-
-                self.path_lookup = {elem: set() for elem in self.elem_id_lookup}
-                for elem in sorted(
-                    self.complexities, key=lambda x: self.complexities[x]
-                ):
-                    for ingredient in self.min_elem_tree[elem]:
-                        if not self.path_lookup[elem]:
-                            self.path_lookup[elem] = self.path_lookup[ingredient].copy()
-                            continue
-                        if ingredient in self.path_lookup[elem]:
-                            continue
-                        for item in self.path_lookup[ingredient]:
-                            self.path_lookup[elem].add(item)
-                    self.path_lookup[elem].add(elem)
+                order = self.calculate_complexities()
+
+                unseen = set(self.elem_id_lookup).difference(self.complexities)
+                if unseen:
+                    print("Warning: Dropping elements:", unseen)
+                    self.element_lock.reader.release()
+                    async with self.element_lock.writer:
+                        for elem_id in unseen:
+                            element = self.elem_id_lookup[elem_id]
+                            self.elements.pop(element.name.lower())
+                            self.combo_lookup.pop(elem_id)
+                            self.used_in_lookup.pop(elem_id)
+                            self.elem_id_lookup.pop(elem_id)
+                            self.found_by_lookup.pop(elem_id)
+                        # As when loading, combos with dropped elements go too
+                        for combo, result in list(self.combos.items()):
+                            if result.id in unseen or unseen.intersection(combo):
+                                self.combos.pop(combo)
+                                if result.id not in unseen:
+                                    self.combo_lookup[result.id].remove(combo)
+                                for elem in combo:
+                                    if elem not in unseen:
+                                        self.used_in_lookup[elem].discard(combo)
+                        for user in self.users.values():
+                            for i in range(len(user.inv) - 1, -1, -1):
+                                if user.inv[i] in unseen:
+                                    user.inv.pop(i)
+                            user.inv.reset_hints()
+                        self.element_index = SearchIndex(self.elements)
+                        self.build_rankings()
+                        self.reset_ids_in_a_row(min(unseen))
+                        self.clear_combo_caches()
+                    await self.element_lock.reader.acquire()
+
+                self.calculate_tree_sizes(order)
+                # Stats were taken from the old complexities and tree sizes
+                self.element_stats_cache.clear()
 
             async with self.category_lock.writer:
                 self.category_lookup: Dict[int, set] = {
@@ -444,6 +963,82 @@ class Database(SavableMixin):
                         if await category.has_element(elem, self):
                             self.category_lookup[elem.id].add(category.name)
 
+    def calculate_complexities(self) -> List[int]:
+        """
+        Calculate the complexity and minimum element tree of every element
+        in one pass, going through elements tier by tier and counting down
+        the ingredients each combo is still missing.
+        Returns element IDs in order of complexity.
+        ``self.complexity_lock.writer`` must be held.
+
+        """
+        self.complexities = {}
+        self.min_elem_tree = {}
+        missing = {combo: len(set(combo)) for combo in self.combos}
+        tiers = [[elem.id for elem in self.starters]]
+        order = []
+        # tiers grows while being iterated over
+        for complexity, tier in enumerate(tiers):
+            for elem_id in tier:
+                if elem_id in self.complexities:
+                    continue
+                if complexity == 0:
+                    self.complexities[elem_id] = 0
+                    self.min_elem_tree[elem_id] = ()
+                else:
+                    # Every element of a lower tier is done, so this
+                    # picks the same combo as it always has
+                    self.get_complexity(elem_id)
+                order.append(elem_id)
+                for combo in self.used_in_lookup[elem_id]:
+                    missing[combo] -= 1
+                    if missing[combo] == 0:
+                        if len(tiers) == complexity + 1:
+                            tiers.append([])
+                        tiers[complexity + 1].append(self.combos[combo].id)
+        return order
+
+    def calculate_tree_sizes(self, order: List[int]) -> None:
+        """
+        Calculate the tree size of every element in ``order``, which must
+        come after its ingredients. Each tree is only kept until everything
+        made from it is done, so the trees are never all held at once.
+        ``self.complexity_lock.writer`` must be held.
+
+        """
+        self.tree_sizes = {}
+        # How many trees each element is still needed for
+        remaining: Dict[int, int] = {}
+        for elem in order:
+            for ingredient in set(self.min_elem_tree[elem]):
+                remaining[ingredient] = remaining.get(ingredient, 0) + 1
+        trees: Dict[int, Set[int]] = {}
+        for elem in order:
+            tree = {elem}
+            for ingredient in set(self.min_elem_tree[elem]):
+                tree.update(trees[ingredient])
+                remaining[ingredient] -= 1
+                if remaining[ingredient] == 0:
+                    del trees[ingredient]
+            self.tree_sizes[elem] = len(tree)
+            if remaining.get(elem):
+                trees[elem] = tree
+
+    def get_tree(self, elem_id: int) -> Set[int]:
+        """
+        Get IDs of every element in the minimum element tree of an element,
+        including itself. ``self.complexity_lock`` must be held.
+
+        """
+        tree = {elem_id}
+        stack = [elem_id]
+        while stack:
+            for ingredient in self.min_elem_tree[stack.pop()]:
+                if ingredient not in tree:
+                    tree.add(ingredient)
+                    stack.append(ingredient)
+        return tree
+
     def get_complexity(self, elem_id: int) -> Union[int, None]:
         """
         Get complexity of element by ID, and add to the minimum element tree.
@@ -473,6 +1068,8 @@ class Database(SavableMixin):
                 created = len(self.created_by_lookup[user.id])
                 if created > user.created_combo_count:
                     user.created_combo_count = created
+                    self.rankings["combos"].set(user.id, created)
+                    self.add_achievement_event(user, "combo")
 
     async def check_colors(self):
         async with self.element_lock.writer:
@@ -487,16 +1084,98 @@ class Database(SavableMixin):
                 combo = [
                     self.elem_id_lookup[x] for x in self.combo_lookup[element.id][0]
                 ]
+                self.preserve(element)
                 element.color = Element.get_color(combo)
 
-    async def update_element_info(
-        self, element: Element, combo: Tuple[int, ...]
-    ) -> None:
-        async with self.complexity_lock.writer:
-            new_complexity = max(self.complexities[x] for x in combo)
-            if new_complexity < self.complexities[element.id]:
-                self.complexities[element.id] = new_complexity
-                self.min_elem_tree[element.id] = combo
+    def update_element_info(self, element: Element, combo: Tuple[int, ...]) -> None:
+        """
+        Lower the complexity of an element if ``combo`` is cheaper, and pass
+        the change on to elements made from it, cheapest first.
+        ``self.complexity_lock.writer`` must be held.
+
+        """
+        changed = []
+        new_complexity = max(self.complexities[x] for x in combo) + 1
+        heap = [(new_complexity, element.id, combo)]
+        while heap:
+            complexity, elem_id, combo = heapq.heappop(heap)
+            if complexity >= self.complexities[elem_id]:
+                continue
+            self.complexities[elem_id] = complexity
+            self.min_elem_tree[elem_id] = combo
+            changed.append(elem_id)
+            for used_in in self.used_in_lookup[elem_id]:
+                if not all(x in self.complexities for x in used_in):
+                    continue
+                result = self.combos[used_in].id
+                new_complexity = max(self.complexities[x] for x in used_in) + 1
+                if new_complexity < self.complexities[result]:
+                    heapq.heappush(heap, (new_complexity, result, used_in))
+
+        # Trees also change for elements whose minimum combo is unchanged
+        affected = set(changed)
+        stack = changed
+        while stack:
+            elem_id = stack.pop()
+            for used_in in self.used_in_lookup[elem_id]:
+                result = self.combos[used_in].id
+                if result in affected or self.min_elem_tree.get(result) != used_in:
+                    continue
+                affected.add(result)
+                stack.append(result)
+        for elem_id in affected:
+            self.tree_sizes[elem_id] = len(self.get_tree(elem_id))
+            # Highest complexity and tree size of users with it may be stale
+            for user_id in self.found_by_lookup[elem_id]:
+                self.element_stats_cache.invalidate(user_id)
+
+    def get_ids_in_a_row(self, user: User) -> int:
+        """
+        Count the user's elements in a row from ID 1, skipping missing IDs.
+        Carries on from where the last count stopped, so each ID is only
+        checked once as elements are granted.
+
+        """
+        inv = user.inv
+        while inv.row_next <= self.max_id:
+            if inv.row_next in self.elem_id_lookup:
+                if inv.row_next not in inv.lookup:
+                    break
+                inv.row_length += 1
+            inv.row_next += 1
+        return inv.row_length
+
+    def get_next_missing(self, user: User) -> Optional[int]:
+        # Lowest existing ID the user is missing, None if they have everything
+        self.get_ids_in_a_row(user)
+        if user.inv.row_next > self.max_id:
+            return None
+        return user.inv.row_next
+
+    def get_hint_choices(self, user: User) -> Set[int]:
+        """
+        Elements the user is missing but has everything for the first
+        combo of. Carries on from the last call, so only elements granted
+        since then have their products checked.
+
+        """
+        inv = user.inv
+        for elem_id in inv[inv.hint_pos :]:
+            inv.hint_choices.discard(elem_id)
+            for combo in self.used_in_lookup[elem_id]:
+                result = self.combos[combo].id
+                if result in inv.lookup or self.combo_lookup[result][0] != combo:
+                    continue
+                if all(x in inv.lookup for x in combo):
+                    inv.hint_choices.add(result)
+        inv.hint_pos = len(inv)
+        return inv.hint_choices
+
+    def reset_ids_in_a_row(self, below: int) -> None:
+        # An ID counted as missing now exists or the other way round
+        for user in self.users.values():
+            if user.inv.row_next > below:
+                user.inv.reset_row()
 
     async def give_element(self, user: User, element: Element) -> None:
         if element.id in user.inv:
@@ -508,39 +1187,45 @@ class Database(SavableMixin):
         async with self.element_lock.writer:
             self.found_by_lookup[element.id].add(user.id)
             user.add_element(element)
-        self.check_achievements_list.add(user)
+            self.rankings["inv"].set(user.id, len(user.inv))
+            self.add_journal_entry("give", user.id, element.id)
+        self.add_achievement_event(user, "element")
 
     def give_element_unsafe(self, user: User, element: int) -> None:
         if element not in user.inv:
             self.found_by_lookup[element].add(user.id)
             user.inv.append(element)
+            self.rankings["inv"].set(user.id, len(user.inv))
+            self.add_journal_entry("give", user.id, element)
 
     async def get_path(self, element: Element) -> List[int]:
         return await self.get_path_ids([element.id])
 
     async def get_path_ids(self, elements: List[int]) -> List[int]:
-        if self.complexity_lock.reader.locked:
+        if self.complexity_lock.writer.locked:
             raise InternalError("Complexity lock", "Complexity calculations in process")
-        async with self.complexity_lock.reader:
-            path = []
-            visited = set()
-            stack = elements.copy()
-            while stack:
-                node = stack[-1]
-                if node not in visited:
-                    # Insufficient to only check min_elem_tree[node][-1]
-                    if not self.min_elem_tree[node] or all(
-                        x in visited for x in self.min_elem_tree[node]
-                    ):
-                        stack.pop()
-                        visited.add(node)
-                        path.append(node)
-                    else:
-                        for child in reversed(self.min_elem_tree[node]):
-                            if child not in visited:
-                                stack.append(child)
-                else:
+        return await self.complexity_lock.read(self.get_path_ids_unsafe, elements)
+
+    def get_path_ids_unsafe(self, elements: List[int]) -> List[int]:
+        path = []
+        visited = set()
+        stack = elements.copy()
+        while stack:
+            node = stack[-1]
+            if node not in visited:
+                # Insufficient to only check min_elem_tree[node][-1]
+                if not self.min_elem_tree[node] or all(
+                    x in visited for x in self.min_elem_tree[node]
+                ):
                     stack.pop()
+                    visited.add(node)
+                    path.append(node)
+                else:
+                    for child in reversed(self.min_elem_tree[node]):
+                        if child not in visited:
+                            stack.append(child)
+            else:
+                stack.pop()
         return path
 
     @staticmethod
@@ -556,45 +1241,66 @@ class Database(SavableMixin):
         database.set_starter_infos()
         return database
 
+    def add_element_unsafe(self, element: Element) -> None:
+        self.elements[element.name.lower()] = element
+        self.element_index.add(element.name.lower())
+        self.elem_id_lookup[element.id] = element
+        self.combo_lookup[element.id] = []
+        self.used_in_lookup[element.id] = set()
+        self.found_by_lookup[element.id] = set()
+        author = element.author.id if element.author else element.author
+        self.created_by_lookup[author].append(element.id)
+        if element.author:
+            self.rankings["suggested"].add(author)
+        if element.id > self.max_id:
+            self.max_id = element.id
+        else:
+            self.reset_ids_in_a_row(element.id)
+        self.add_journal_entry("element", element)
+
     async def add_element(self, element: Element):
         async with self.element_lock.writer:
             if element.name.lower() not in self.elements:
-                self.elements[element.name.lower()] = element
-                self.elem_id_lookup[element.id] = element
-                self.combo_lookup[element.id] = []
-                self.used_in_lookup[element.id] = set()
-                self.found_by_lookup[element.id] = set()
-                self.created_by_lookup[element.author.id].append(element.id)
+                self.add_element_unsafe(element)
         async with self.category_lock.writer:
             for category in self.categories.values():
                 if not isinstance(category, ElementCategory):
                     if category.has_element(element):
                         self.category_lookup[element].add(category.name)
 
+    def has_element_unsafe(self, element: str) -> bool:
+        return element.lower() in self.elements
+
     async def has_element(self, element: str) -> bool:
-        async with self.element_lock.reader:
-            return element.lower() in self.elements
+        return await self.element_lock.read(self.has_element_unsafe, element)
+
+    def get_combo_result_unsafe(
+        self, combo: Tuple[Element, ...]
+    ) -> Union[Element, None]:
+        return self.combos.get(get_combo_key([elem.id for elem in combo]))
 
     async def get_combo_result(
         self, combo: Tuple[Element, ...]
     ) -> Union[Element, None]:
-        async with self.element_lock.reader:
-            sorted_combo = tuple(sorted(elem.id for elem in combo))
-            if sorted_combo in self.combos:
-                return self.combos[sorted_combo]
-            return None
+        return await self.element_lock.read(self.get_combo_result_unsafe, combo)
+
+    def clear_combo_caches(self) -> None:
+        # Element names now point elsewhere
+        for user in self.users.values():
+            user.combo_cache = None
 
     async def set_combo_result(
         self, combo: Tuple[Element, ...], result: Element
     ) -> None:
         async with self.element_lock.writer:
-            sorted_combo = tuple(sorted(elem.id for elem in combo))
+            sorted_combo = get_combo_key([elem.id for elem in combo])
             if sorted_combo in self.combos:
                 raise InternalError("Combo exists", "That combo already exists")
             if result.name.lower() not in self.elements:
                 await self.add_element(result)
             self.combos[sorted_combo] = result
             self.combo_lookup[result.id].append(sorted_combo)
+            self.add_journal_entry("combo", sorted_combo, result.id)
         async with self.complexity_lock.writer:
             if result.id not in self.complexities:
                 if self.get_complexity(result.id) is None:
@@ -602,12 +1308,19 @@ class Database(SavableMixin):
                         "Failed getting complexity",
                         "No combo found with existing complexity",
                     )
-                self.path_lookup[result.id] = set(await self.get_path(result))
+                self.tree_sizes[result.id] = len(self.get_tree(result.id))
             else:
-                await self.update_element_info(result, sorted_combo)
+                self.update_element_info(result, sorted_combo)
         async with self.element_lock.writer:
             for elem in sorted_combo:
                 self.used_in_lookup[elem].add(sorted_combo)
+            if self.combo_lookup[result.id][0] == sorted_combo:
+                # Users that already had the combo are not checked again
+                for user in self.users.values():
+                    inv = user.inv
+                    if inv.hint_pos and result.id not in inv.lookup:
+                        if all(x in inv.lookup for x in sorted_combo):
+                            inv.hint_choices.add(result.id)
 
     def convert_to_dict(self, data: dict) -> None:
         # Users MUST be first to be saved or loaded
@@ -654,3 +1367,107 @@ class Database(SavableMixin):
             polls,
             categories,
         )
+
+
+class DatabaseSnapshot:
+    """
+    A frozen view of a :class:`Database`, taken by ``Database.freeze``
+    and read in another thread with :meth:`read`.
+
+    Nothing is copied up front besides the containers. Inventories and
+    achievements are only ever appended to, so users just remember
+    their lengths and stats. Elements and categories are shared until
+    changed, ``Database.preserve`` copies them here first.
+
+    """
+
+    def __init__(self, db: Database) -> None:
+        self.db = db
+        self.elements = db.elements.copy()
+        self.starters = db.starters
+        self.combos = db.combos.copy()
+        self.users = [
+            (
+                user,
+                len(user.inv),
+                user.active_polls,
+                user.created_combo_count,
+                user.votes_cast_count,
+                len(user.achievements),
+                user.icon,
+            )
+            for user in db.users.values()
+        ]
+        # Few enough to copy now, by id() to find the copy of a poll
+        self.poll_copies = {id(poll): copy.copy(poll) for poll in db.polls}
+        self.polls = list(self.poll_copies.values())
+        self.categories = db.categories.copy()
+        self.shared_ids = {id(item) for item in self.elements.values()}
+        self.shared_ids.update(id(item) for item in self.categories.values())
+        # Copies of elements and categories by id(), as they were
+        self.preserved: Dict[int, Union[Element, Category]] = {}
+
+    def preserve(self, item: Union[Element, Category]) -> None:
+        if id(item) not in self.shared_ids or id(item) in self.preserved:
+            return
+        frozen = copy.copy(item)
+        if isinstance(frozen, ElementCategory):
+            frozen.elements = list(frozen.elements)
+        else:
+            frozen.extra_authors = list(frozen.extra_authors)
+        self.preserved[id(item)] = frozen
+
+    def get_database(self, preserved: Dict[int, Any]) -> Database:
+        # Only the attributes that are saved are set
+        db = Database.__new__(Database)
+        db.starters = self.starters
+        db.polls = self.polls
+        db.users = {}
+        for user, inv, polls, combos, votes, achievements, icon in self.users:
+            frozen = User.__new__(User)
+            frozen.id = user.id
+            frozen.inv = user.inv[:inv]
+            frozen.active_polls = polls
+            frozen.created_combo_count = combos
+            frozen.votes_cast_count = votes
+            frozen.achievements = user.achievements[:achievements]
+            frozen.icon = icon
+            db.users[user.id] = frozen
+        if not preserved:
+            db.elements = self.elements
+            db.combos = self.combos
+            db.categories = self.categories
+            return db
+        db.elements = {
+            name: preserved.get(id(element), element)
+            for name, element in self.elements.items()
+        }
+        db.combos = {
+            combo: preserved.get(id(result), result)
+            for combo, result in self.combos.items()
+        }
+        db.categories = {
+            name: preserved.get(id(category), category)
+            for name, category in self.categories.items()
+        }
+        return db
+
+    def read(self, func) -> Any:
+        """
+        Call ``func`` with the database as it was when frozen. Elements
+        and categories are read as they are, so if any were changed
+        meanwhile ``func`` is called again with their preserved copies.
+
+        """
+        while True:
+            # Copying a dict is atomic, the event loop can't change it midway
+            preserved = self.preserved.copy()
+            result = func(self.get_database(preserved))
+            if len(self.preserved) == len(preserved):
+                return result
+
+    def release(self) -> None:
+        # Replaced rather than changed as preserve may be going through it
+        self.db.snapshots = [
+            snapshot for snapshot in self.db.snapshots if snapshot is not self
+        ]
@@ -5,6 +5,7 @@ from pyeod.model import (
     AddCollabPoll,
     ColorPoll,
     Database,
+    DatabaseSnapshot,
     DefaultSavableMixinMapping,
     Element,
     ElementCategory,
@@ -13,20 +14,28 @@ from pyeod.model import (
     IconPoll,
     ImagePoll,
     MarkPoll,
+    PlainSavableMixinMapping,
     RemoveCategoryPoll,
     RemoveCollabPoll,
     SavableMixin,
     SavableMixinMapping,
     User,
 )
+from pyeod.errors import InternalError
 import msgpack
-from typing import Dict, List, Type, Union
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Type, Tuple, Union, Optional
 import os
+import sys
 import copy
+import mmap
+import array
+import itertools
+import time
+import shutil
 import asyncio
 import functools
-import threading
-import multiprocessing
+import traceback
 
 types: List[Type[SavableMixin]] = [
     Element,
@@ -86,33 +95,605 @@ def convert_from_dict(
     return type.convert_from_dict(loader, data)
 
 
-def multiprocess_save(instance: GameInstance, filename: str) -> None:
-    data = msgpack.dumps(instance, default=convert_to_dict)
+# All file writes go through this thread, in order, so journal
+# rotation never races with appends from the save loop
+writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pyeod-writer")
+# filename -> {"snapshot_seconds", "snapshot_bytes", "journal_seconds", ...}
+save_stats: Dict[str, Dict[str, float]] = {}
+
+
+def record_save_stats(filename: str, kind: str, tic: float, size: int) -> None:
+    stats = save_stats.setdefault(filename, {})
+    stats[kind + "_seconds"] = time.perf_counter() - tic
+    stats[kind + "_bytes"] = size
+    stats[kind + "_time"] = time.time()
+
+
+def print_write_error(future: Future) -> None:
+    if future.exception() is not None:
+        err = future.exception()
+        print("Ignored exception in writer thread")
+        traceback.print_exception(type(err), err, err.__traceback__)
+
+
+# Columnar snapshots store each field of elements, users and combos as
+# one packed array instead of a msgpack map per object, which makes
+# large databases much quicker to write and read back
+COLUMNAR_MAGIC = b"\x07EODC\x07"
+COLUMNAR_VERSION = 2
+NO_USER = -1  # Stands in for None, 0 is kept for glitched elements
+# Element ids and small counters fit in 32 bits, user ids and times don't
+SMALL = "i"
+# Narrowest first, see get_typecode
+INT_TYPECODES = ("b", "h", "i", "q")
+
+
+def get_typecode(low: int, high: int) -> str:
+    for typecode in INT_TYPECODES:
+        limit = 1 << (array.array(typecode).itemsize * 8 - 1)
+        if -limit <= low and high < limit:
+            return typecode
+    return "q"
+
+
+def pack_ints(values, typecode: Optional[str] = None) -> Tuple[str, bytes]:
+    # Without a typecode the narrowest one that fits the values is used
+    arr = array.array(typecode or "q", values)
+    if typecode is None:
+        typecode = get_typecode(min(arr, default=0), max(arr, default=0))
+        if typecode != "q":
+            arr = array.array(typecode, arr)
+    if sys.byteorder == "big":
+        arr.byteswap()  # Always stored little endian
+    return typecode, arr.tobytes()
+
+
+def unpack_ints(column, typecode: str = "q") -> array.array:
+    if isinstance(column, list):
+        typecode, data = column
+    else:
+        data = column  # Version 1 stored no typecode
+    arr = array.array(typecode)
+    arr.frombytes(data)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
+
+
+def pack_offsets(lengths) -> Tuple[str, bytes]:
+    offsets = array.array("q", itertools.accumulate(lengths, initial=0))
+    # Offsets only grow, so the last one decides the width
+    return pack_ints(offsets, get_typecode(0, offsets[-1]))
+
+
+def pack_strings(strings: List[str]) -> Tuple[bytes, Tuple[str, bytes]]:
+    # Offsets count characters, not bytes, so slicing the decoded table works
+    table = "".join(strings).encode("utf-8", "surrogatepass")
+    return table, pack_offsets(map(len, strings))
+
+
+def unpack_strings(table: bytes, offsets) -> List[str]:
+    text = table.decode("utf-8", "surrogatepass")
+    offsets = unpack_ints(offsets)
+    return [text[offsets[i] : offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+
+def pack_lists(lists: List[List[int]], typecode: Optional[str] = None) -> tuple:
+    values = itertools.chain.from_iterable(lists)
+    return pack_ints(values, typecode), pack_offsets(map(len, lists))
+
+
+def unpack_lists(values, offsets, typecode: str = "q") -> List[List[int]]:
+    values = unpack_ints(values, typecode)
+    offsets = unpack_ints(offsets)
+    return [
+        values[offsets[i] : offsets[i + 1]].tolist() for i in range(len(offsets) - 1)
+    ]
+
+
+def get_user_id(user: Optional[User]) -> int:
+    if user is None:
+        return NO_USER
+    # author can be 0
+    return user.id if user else user
+
+
+def convert_to_columns(instance: GameInstance) -> bytes:
+    db = instance.db
+    elements = list(db.elements.values())
+    users = list(db.users.values())
+    combos = list(db.combos.items())
+
+    columns = {"version": COLUMNAR_VERSION}
+    columns["user_ids"] = pack_ints(user.id for user in users)
+    columns["user_inv"] = pack_lists([user.inv for user in users], SMALL)
+    columns["user_active_polls"] = pack_ints(user.active_polls for user in users)
+    columns["user_created_combo_count"] = pack_ints(
+        user.created_combo_count for user in users
+    )
+    columns["user_votes_cast_count"] = pack_ints(
+        user.votes_cast_count for user in users
+    )
+    columns["user_achievements"] = pack_lists(
+        [list(itertools.chain.from_iterable(user.achievements)) for user in users],
+        SMALL,
+    )
+    columns["user_icon"] = pack_ints((user.icon for user in users), SMALL)
+
+    columns["elem_ids"] = pack_ints((elem.id for elem in elements), SMALL)
+    columns["elem_names"] = pack_strings([elem.name.strip() for elem in elements])
+    columns["elem_author"] = pack_ints(get_user_id(elem.author) for elem in elements)
+    columns["elem_created"] = pack_ints(elem.created for elem in elements)
+    columns["elem_mark"] = pack_strings([elem.mark for elem in elements])
+    columns["elem_marker"] = pack_ints(get_user_id(elem.marker) for elem in elements)
+    columns["elem_color"] = pack_ints((elem.color for elem in elements), SMALL)
+    columns["elem_colorer"] = pack_ints(
+        get_user_id(elem.colorer) for elem in elements
+    )
+    columns["elem_extra_authors"] = pack_lists(
+        [[user.id for user in elem.extra_authors] for elem in elements]
+    )
+    columns["elem_image"] = pack_strings([elem.image for elem in elements])
+    columns["elem_imager"] = pack_ints(get_user_id(elem.imager) for elem in elements)
+    columns["elem_icon"] = pack_strings([elem.icon for elem in elements])
+    columns["elem_iconer"] = pack_ints(get_user_id(elem.iconer) for elem in elements)
+
+    columns["starters"] = pack_ints((elem.id for elem in db.starters), SMALL)
+    columns["combos"] = pack_lists([combo for combo, _ in combos], SMALL)
+    columns["combo_results"] = pack_ints((result.id for _, result in combos), SMALL)
+
+    # Polls, categories and settings are small and irregular,
+    # they are kept as msgpack and decoded once users and elements exist
+    state = {}
+    instance.convert_to_dict(state)
+    state.pop("db")
+    columns["type"] = type(instance).__name__
+    columns["state"] = msgpack.dumps(state, default=convert_to_dict)
+    columns["polls"] = msgpack.dumps(db.polls, default=convert_to_dict)
+    columns["categories"] = msgpack.dumps(
+        list(db.categories.values()), default=convert_to_dict
+    )
+    return COLUMNAR_MAGIC + msgpack.dumps(columns)
+
+
+def convert_from_columns(data: Union[bytes, mmap.mmap]) -> GameInstance:
+    # Slicing a memoryview avoids copying the whole snapshot
+    with memoryview(data) as view, view[len(COLUMNAR_MAGIC) :] as body:
+        columns = msgpack.loads(body)
+    if columns["version"] > COLUMNAR_VERSION:
+        raise InternalError(
+            "Unsupported snapshot",
+            f"Columnar snapshot version {columns['version']} is not supported",
+        )
+    loader = InstanceLoader()
+
+    user_ids = unpack_ints(columns["user_ids"])
+    user_inv = unpack_lists(*columns["user_inv"], SMALL)
+    user_active_polls = unpack_ints(columns["user_active_polls"])
+    user_created_combo_count = unpack_ints(columns["user_created_combo_count"])
+    user_votes_cast_count = unpack_ints(columns["user_votes_cast_count"])
+    user_achievements = unpack_lists(*columns["user_achievements"], SMALL)
+    user_icon = unpack_ints(columns["user_icon"], SMALL)
+    users = {}
+    for i, id in enumerate(user_ids):
+        achievements = user_achievements[i]
+        user = User(
+            id,
+            user_inv[i],
+            user_active_polls[i],
+            user_created_combo_count[i],
+            user_votes_cast_count[i],
+            [achievements[j : j + 2] for j in range(0, len(achievements), 2)],
+            user_icon[i],
+        )
+        users[id] = user
+        loader.users[id] = user
+
+    user_lookup = loader.users.copy()
+    user_lookup[NO_USER] = None
+    elem_ids = unpack_ints(columns["elem_ids"], SMALL)
+    elem_names = unpack_strings(*columns["elem_names"])
+    elem_author = unpack_ints(columns["elem_author"])
+    elem_created = unpack_ints(columns["elem_created"])
+    elem_mark = unpack_strings(*columns["elem_mark"])
+    elem_marker = unpack_ints(columns["elem_marker"])
+    elem_color = unpack_ints(columns["elem_color"], SMALL)
+    elem_colorer = unpack_ints(columns["elem_colorer"])
+    elem_extra_authors = unpack_lists(*columns["elem_extra_authors"])
+    elem_image = unpack_strings(*columns["elem_image"])
+    elem_imager = unpack_ints(columns["elem_imager"])
+    elem_icon = unpack_strings(*columns["elem_icon"])
+    elem_iconer = unpack_ints(columns["elem_iconer"])
+    elements = {}
+    for i, id in enumerate(elem_ids):
+        element = Element(
+            elem_names[i],
+            user_lookup[elem_author[i]],
+            elem_created[i],
+            id,
+            elem_mark[i],
+            user_lookup[elem_marker[i]],
+            elem_color[i],
+            user_lookup[elem_colorer[i]],
+            [user_lookup[user] for user in elem_extra_authors[i]],
+            elem_image[i],
+            user_lookup[elem_imager[i]],
+            elem_icon[i],
+            user_lookup[elem_iconer[i]],
+        )
+        elements[element.name.lower()] = element
+        loader.elem_id_lookup[id] = element
+
+    starter_ids = unpack_ints(columns["starters"], SMALL)
+    try:
+        starters = tuple(loader.elem_id_lookup[elem] for elem in starter_ids)
+    except KeyError as e:
+        raise InternalError("Starters not found", "Starters not found") from e
+    combos = {}
+    combo_keys = unpack_lists(*columns["combos"], SMALL)
+    for combo, result in zip(combo_keys, unpack_ints(columns["combo_results"], SMALL)):
+        if result in loader.elem_id_lookup:
+            combos[tuple(combo)] = loader.elem_id_lookup[result]
+        else:
+            print("Warning: dropping combo", tuple(combo), "for element", result)
+
+    hook = functools.partial(convert_from_dict, loader, DefaultSavableMixinMapping)
+    polls = msgpack.loads(columns["polls"], strict_map_key=False, object_hook=hook)
+    categories = msgpack.loads(
+        columns["categories"], strict_map_key=False, object_hook=hook
+    )
+    db = Database(
+        elements,
+        starters,
+        combos,
+        users,
+        [poll for poll in polls if poll is not None],
+        {cat.name.lower(): cat for cat in categories},
+    )
+    state = msgpack.loads(columns["state"], strict_map_key=False, object_hook=hook)
+    state["db"] = db
+    instance_type = type_dict[columns["type"]]
+    return instance_type.convert_from_dict(loader, PlainSavableMixinMapping(state))
+
+
+def encode_snapshot(instance: GameInstance) -> bytes:
+    if config.COLUMNAR_SNAPSHOTS:
+        return convert_to_columns(instance)
+    return msgpack.dumps(instance, default=convert_to_dict)
+
+
+def write_snapshot(
+    instance: GameInstance,
+    filename: str,
+    snapshot: Optional[DatabaseSnapshot] = None,
+) -> None:
+    tic = time.perf_counter()
+    if snapshot is None:
+        data = encode_snapshot(instance)
+    else:
+        # instance.db is swapped out for the frozen database
+        def encode(db: Database) -> bytes:
+            instance.db = db
+            return encode_snapshot(instance)
+
+        try:
+            data = snapshot.read(encode)
+        finally:
+            snapshot.release()
     os.makedirs(os.path.join(config.package, "db"), exist_ok=True)
-    with open(os.path.join(config.package, "db", filename), "wb+") as f:
+    path = os.path.join(config.package, "db", filename)
+    # Write then rename so a crash never leaves a half written snapshot
+    with open(path + ".tmp", "wb+") as f:
         f.write(data)
+    os.replace(path + ".tmp", path)
+    # Rotated journal is covered by the new snapshot
+    old_journal = get_journal_path(path) + ".old"
+    if os.path.isfile(old_journal):
+        os.remove(old_journal)
+    record_save_stats(filename, "snapshot", tic, len(data))
 
 
-def save_instance(instance: GameInstance, filename: str) -> multiprocessing.Process:
+def save_instance(instance: GameInstance, filename: str) -> Future:
     instance2 = copy.copy(instance)  # don't deepcopy, no need
-    old_db = instance2.db
-    instance2.db = Database.__new__(Database)
-    instance2.db.elements = old_db.elements
-    instance2.db.starters = old_db.starters
-    instance2.db.combos = old_db.combos
-    instance2.db.users = old_db.users
-    instance2.db.polls = old_db.polls
-    instance2.db.categories = old_db.categories
-    process = multiprocessing.Process(
-        target=multiprocess_save, args=(instance2, filename)
+    # Encoded from a frozen view, the instance can keep changing meanwhile
+    snapshot = instance.db.freeze()
+    if isinstance(instance, DiscordGameInstance):
+        # Saved as indexes into the polls, so point at the frozen copies
+        instance2.poll_msg_lookup = {
+            msg_id: snapshot.poll_copies.get(id(poll), poll)
+            for msg_id, poll in instance.poll_msg_lookup.items()
+        }
+    future = writer.submit(write_snapshot, instance2, filename, snapshot)
+    future.add_done_callback(print_write_error)
+    return future
+
+
+def get_journal_path(file: str) -> str:
+    return os.path.splitext(file)[0] + ".journal"
+
+
+def get_user_stats(user: User) -> Tuple[int, ...]:
+    # Achievements are only ever appended to
+    return (
+        user.active_polls,
+        user.created_combo_count,
+        user.votes_cast_count,
+        len(user.achievements),
+        user.icon,
     )
-    process.start()
-    return process
+
+
+def append_journal(filename: str, data: bytes) -> None:
+    tic = time.perf_counter()
+    os.makedirs(os.path.join(config.package, "db"), exist_ok=True)
+    path = get_journal_path(os.path.join(config.package, "db", filename))
+    with open(path, "ab") as f:
+        f.write(data)
+    record_save_stats(filename, "journal", tic, len(data))
+
+
+def rotate_journal(filename: str) -> None:
+    path = get_journal_path(os.path.join(config.package, "db", filename))
+    if not os.path.isfile(path):
+        return
+    if os.path.isfile(path + ".old"):
+        # Previous snapshot failed, keep both journals
+        with open(path, "rb") as src, open(path + ".old", "ab") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(path)
+    else:
+        os.replace(path, path + ".old")
+
+
+def save_journal(instance: GameInstance, filename: str) -> Optional[Future]:
+    """
+    Append changes made since the last call to the journal
+    of ``filename``. Much cheaper than ``save_instance`` as
+    only the changes are written.
+
+    """
+    db = instance.db
+    if db.journal_generation == db.generation:
+        return None
+    db.journal_generation = db.generation
+    ops = db.journal
+    db.journal = []
+    for user in db.users.values():
+        stats = get_user_stats(user)
+        if db.journal_user_stats.get(user.id) != stats:
+            db.journal_user_stats[user.id] = stats
+            ops.append(
+                (
+                    "stats",
+                    user.id,
+                    user.active_polls,
+                    user.created_combo_count,
+                    user.votes_cast_count,
+                    user.achievements,
+                    user.icon,
+                )
+            )
+    # Settings and polls are small, write them out every time
+    state = {}
+    instance.convert_to_dict(state)
+    state.pop("db")
+    state["polls"] = db.polls
+    ops.append(("state", state))
+
+    # Pack here so the journal matches the current state
+    packer = msgpack.Packer(default=convert_to_dict)
+    data = b"".join(packer.pack(op) for op in ops)
+    future = writer.submit(append_journal, filename, data)
+    future.add_done_callback(print_write_error)
+    return future
+
+
+snapshot_futures: Dict[str, Future] = {}
+
+
+def compact_instance(instance: GameInstance, filename: str) -> Optional[Future]:
+    """
+    Write a full snapshot of the instance and rotate the journal,
+    which gets deleted once the snapshot is written.
+    Returns ``None`` if the snapshot on disk is up to date.
+
+    """
+    save_journal(instance, filename)
+    future = snapshot_futures.get(filename)
+    if future is not None:
+        if not future.done():
+            # Don't queue up snapshots on a slow disk, changes
+            # are kept in the journal until the next compaction
+            return future
+        if future.exception() is not None:
+            instance.db.snapshot_generation = -1
+    if instance.db.snapshot_generation == instance.db.generation:
+        return None
+
+    instance.db.snapshot_generation = instance.db.generation
+    writer.submit(rotate_journal, filename).add_done_callback(print_write_error)
+    future = save_instance(instance, filename)
+    snapshot_futures[filename] = future
+    return future
+
+
+async def write_current_snapshot(instance: GameInstance, filename: str) -> None:
+    # Compacted again if changes came in while the last snapshot was written
+    while True:
+        await instance.db.acquire_all_locks()
+        try:
+            future = compact_instance(instance, filename)
+        finally:
+            instance.db.release_all_locks()
+        if future is None:
+            return
+        await asyncio.wrap_future(future)
+
+
+def flush_writes() -> Future:
+    # The writer runs one job at a time, in order
+    return writer.submit(lambda: None)
+
+
+def snapshot_is_current(instance: GameInstance, filename: str) -> bool:
+    """
+    Whether the snapshot of ``filename`` holds every change
+    to the instance, so it can be loaded again from disk.
+
+    """
+    if instance.db.snapshot_generation != instance.db.generation:
+        return False
+    future = snapshot_futures.get(filename)
+    if future is None:
+        return True
+    return future.done() and future.exception() is None
+
+
+def delete_journal(file: str) -> None:
+    path = get_journal_path(file)
+    for journal in [path + ".old", path]:
+        if os.path.isfile(journal):
+            os.remove(journal)
+
+
+def apply_journal_op(
+    instance: GameInstance, loader: InstanceLoader, op: list
+) -> GameInstance:
+    db = instance.db
+    if op[0] == "user":
+        if op[1] not in db.users:
+            user = User(op[1], [elem.id for elem in db.starters])
+            db.users[user.id] = user
+            db.created_by_lookup[user.id] = []
+            for elem in user.inv:
+                db.found_by_lookup[elem].add(user.id)
+            loader.users[user.id] = user
+    elif op[0] == "give":
+        if op[1] in db.users and op[2] in db.elem_id_lookup:
+            db.give_element_unsafe(db.users[op[1]], op[2])
+    elif op[0] == "element":
+        element = op[1]
+        if element.id in db.elem_id_lookup:
+            # Update in place so existing references stay valid
+            existing = db.elem_id_lookup[element.id]
+            db.elements.pop(existing.name.lower())
+            db.element_index.remove(existing.name.lower())
+            for attr in Element.__slots__:
+                setattr(existing, attr, getattr(element, attr))
+            db.elements[existing.name.lower()] = existing
+            db.element_index.add(existing.name.lower())
+        else:
+            db.add_element_unsafe(element)
+            existing = element
+        loader.elem_id_lookup[element.id] = existing
+    elif op[0] == "combo":
+        combo = tuple(op[1])
+        if combo in db.combos or op[2] not in db.elem_id_lookup:
+            return instance
+        if any(elem not in db.elem_id_lookup for elem in combo):
+            return instance
+        db.combos[combo] = db.elem_id_lookup[op[2]]
+        db.combo_lookup[op[2]].append(combo)
+        for elem in combo:
+            db.used_in_lookup[elem].add(combo)
+    elif op[0] == "stats":
+        if op[1] in db.users:
+            user = db.users[op[1]]
+            user.active_polls = op[2]
+            user.created_combo_count = op[3]
+            user.votes_cast_count = op[4]
+            user.achievements = op[5]
+            user.icon = op[6]
+    elif op[0] == "category":
+        db.categories[op[1].name.lower()] = op[1]
+        db.category_index.add(op[1].name.lower())
+    elif op[0] == "remove_category":
+        db.categories.pop(op[1].lower(), None)
+        db.category_index.remove(op[1].lower())
+    elif op[0] == "state":
+        state = op[1]
+        db.polls = [poll for poll in state.pop("polls") if poll is not None]
+        state["db"] = db
+        mapping = PlainSavableMixinMapping(state)
+        instance = type(instance).convert_from_dict(loader, mapping)
+    else:
+        print("Warning: unknown journal entry", op[0])
+    return instance
+
+
+def replay_journal(instance: GameInstance, file: str) -> GameInstance:
+    db = instance.db
+    loader = InstanceLoader()
+    loader.users.update(db.users)
+    loader.elem_id_lookup.update(db.elem_id_lookup)
+    hook = functools.partial(convert_from_dict, loader, DefaultSavableMixinMapping)
+
+    count = 0
+    path = get_journal_path(file)
+    # Rotated journal is older, it only exists if the last snapshot failed
+    for journal in [path + ".old", path]:
+        if not os.path.isfile(journal):
+            continue
+        with open(journal, "rb") as f:
+            # Incomplete entry at the end from a crash is ignored
+            unpacker = msgpack.Unpacker(f, strict_map_key=False, object_hook=hook)
+            for op in unpacker:
+                instance = apply_journal_op(instance, loader, op)
+                count += 1
+
+    # Replayed changes are already on disk
+    db.journal = []
+    db.generation = 0
+    db.journal_generation = 0
+    # Snapshot is out of date if anything was replayed
+    db.snapshot_generation = 0 if count == 0 else -1
+    for user in db.users.values():
+        db.journal_user_stats[user.id] = get_user_stats(user)
+    if count:
+        db.build_rankings()
+        print("Replayed", count, "journal entries for", os.path.basename(file))
+    return instance
 
 
 def load_instance(file: str) -> GameInstance:
+    """
+    Load the snapshot and journal of ``file``, safe to call from another
+    thread. The instance must go through ``prepare_instance`` before use.
+
+    """
+    tic = time.perf_counter()
+    # Mapped rather than read so the file and the decoded
+    # instance are never both held in memory
     with open(file, "rb") as f:
-        data = f.read()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            instance = decode_instance(data)
+            size = len(data)
+    instance = replay_journal(instance, file)
+    record_save_stats(os.path.basename(file), "load", tic, size)
+    return instance
+
+
+async def prepare_instance(instance: GameInstance, file: str) -> None:
+    # Info commands need the complexities, so these finish before it is used
+    await asyncio.gather(
+        instance.db.check_colors(),
+        instance.db.check_suggested_combos(),
+        instance.db.calculate_infos(),
+    )
+    print("Finished calculating complexity for", os.path.basename(file))
+
+
+def get_last_modified(file: str) -> float:
+    # The journal is written on every change, the snapshot only on compaction
+    journal = get_journal_path(file)
+    if os.path.isfile(journal):
+        return max(os.path.getmtime(file), os.path.getmtime(journal))
+    return os.path.getmtime(file)
+
+
+def decode_instance(data: mmap.mmap) -> GameInstance:
+    if data[: len(COLUMNAR_MAGIC)] == COLUMNAR_MAGIC:
+        return convert_from_columns(data)
 
     # Assuming the outer dict has <16 elements and the type key is <32 chars
     indicator_check = data[1:33]
@@ -131,27 +712,7 @@ def load_instance(file: str) -> GameInstance:
 
     loader = InstanceLoader()
     hook = functools.partial(convert_from_dict, loader, mapping_type)
-    instance: GameInstance = msgpack.loads(data, strict_map_key=False, object_hook=hook)
-    # Free up some unneeded local variables
-    del loader, hook, data
-
-    def wrapper(loop):
-        task1 = asyncio.run_coroutine_threadsafe(instance.db.check_colors(), loop=loop)
-        task2 = asyncio.run_coroutine_threadsafe(
-            instance.db.check_suggested_combos(), loop=loop
-        )
-        task3 = asyncio.run_coroutine_threadsafe(
-            instance.db.calculate_infos(), loop=loop
-        )
-        task1.result()
-        task2.result()
-        task3.result()
-        print("Finished calculating complexity for", os.path.basename(file))
-
-    loop = asyncio.get_event_loop()
-    t = threading.Thread(target=wrapper, args=(loop,), daemon=True)
-    t.start()
-    return instance
+    return msgpack.loads(data, strict_map_key=False, object_hook=hook)
 
 
 async def test_function():
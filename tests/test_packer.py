@@ -0,0 +1,36 @@
+from pyeod import config
+from pyeod.frontend import DiscordGameInstance
+from pyeod.packer import decode_instance, save_instance
+import os
+import asyncio
+
+
+async def save_and_reload_poll(columnar: bool) -> None:
+    instance = DiscordGameInstance()
+    user = await instance.login_user(0)
+    elements = await instance.check_elements(("fire", "fire"))
+    poll = await instance.suggest_element(user, elements, "Inferno")
+    instance.poll_msg_lookup[1] = poll
+
+    original = config.COLUMNAR_SNAPSHOTS
+    try:
+        config.COLUMNAR_SNAPSHOTS = columnar
+        save_instance(instance, "test.eod").result()
+    finally:
+        config.COLUMNAR_SNAPSHOTS = original
+
+    with open(os.path.join(config.package, "db", "test.eod"), "rb") as f:
+        loaded = decode_instance(f.read())
+    assert len(loaded.db.polls) == 1, "Pending poll was not saved"
+    assert loaded.poll_msg_lookup[1] is loaded.db.polls[0]
+    assert loaded.db.polls[0].result == "Inferno"
+
+
+def test_pending_polls_survive_saving(tmp_path):
+    package = config.package
+    try:
+        config.package = str(tmp_path)
+        for columnar in [True, False]:
+            asyncio.run(save_and_reload_poll(columnar))
+    finally:
+        config.package = package